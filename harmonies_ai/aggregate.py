@@ -0,0 +1,240 @@
+import base64
+import json
+import os
+from collections import Counter
+from importlib.util import find_spec
+from math import sqrt
+from pathlib import Path
+from typing import Any, Iterable
+import numpy as np
+
+
+def _bin(value: float):
+    # Floats such as timings are binned to two significant figures, so the
+    # histogram stays small however many values are added
+    return value if isinstance(value, int) else float(f"{value:.2g}")
+
+
+class RunningStats:
+    """Count, mean, variance, range and histogram of a stream of values.
+
+    The mean and variance are updated with Welford's method, and the histogram
+    counts each distinct value, which stays small for integer score components.
+    """
+
+    count: int
+    mean: float
+    _m2: float
+    min: float
+    max: float
+    histogram: Counter[float]
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.histogram = Counter()
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.histogram[_bin(value)] += 1
+
+    def add_array(self, values: np.ndarray):
+        """Add every value in an array, merging in its statistics with Chan's method."""
+        if not len(values):
+            return
+        count = len(values)
+        mean = float(values.mean())
+        total = self.count + count
+        delta = mean - self.mean
+        self._m2 += float(((values - mean) ** 2).sum())
+        self._m2 += delta**2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, values.min().item())
+        self.max = max(self.max, values.max().item())
+        unique, counts = np.unique(values, return_counts=True)
+        for value, n in zip(unique.tolist(), counts.tolist()):
+            self.histogram[_bin(value)] += n
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return sqrt(self.variance)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self._m2,
+            "min": self.min,
+            "max": self.max,
+            "histogram": [[value, n] for value, n in sorted(self.histogram.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]):
+        stats = cls()
+        stats.count = data["count"]
+        stats.mean = data["mean"]
+        stats._m2 = data["m2"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        stats.histogram = Counter({value: n for value, n in data["histogram"]})
+        return stats
+
+
+def _write_atomic(path: Path, data: bytes):
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def parquet_available():
+    """Whether pandas has an engine to write Parquet, without importing one."""
+    return any(find_spec(engine) for engine in ("pyarrow", "fastparquet"))
+
+
+class ShardedResults:
+    """Aggregates game results as they arrive, writing rows out in shards.
+
+    Rows are buffered until `shard_size` games have finished, then written as
+    one CSV or Parquet shard, and the running statistics and the games done so
+    far are saved next to the shards. Opening the same directory again carries
+    on from the last shard written, so only games since then need replaying.
+    """
+
+    stats: dict[str, RunningStats]
+    shards: int
+    # Bitmap of the games written out to shards, by game number
+    _completed: bytearray
+    _rows: list[dict[str, Any]]
+
+    def __init__(
+        self,
+        path: Path,
+        stats_columns: Iterable[str],
+        shard_size: int = 10000,
+        shard_format: str = "csv",
+    ):
+        if shard_format not in ("csv", "parquet"):
+            raise Exception(f"Unknown shard format {shard_format}")
+        # Checked up front, as otherwise nothing fails until the first shard
+        # is written, after shard_size games have been played
+        if shard_format == "parquet" and not parquet_available():
+            raise Exception("Parquet shards need pyarrow or fastparquet installed")
+        self.path = path
+        self.shard_size = shard_size
+        self.shard_format = shard_format
+
+        self.stats = {column: RunningStats() for column in stats_columns}
+        self.shards = 0
+        self._completed = bytearray()
+        self._rows = []
+
+        path.mkdir(parents=True, exist_ok=True)
+        if self._state_path.exists():
+            self._load()
+
+    @property
+    def _state_path(self):
+        return self.path / "state.json"
+
+    def _shard_path(self, shard: int):
+        return self.path / f"shard-{shard:05}.{self.shard_format}"
+
+    @property
+    def games(self):
+        """Number of games added, including any not yet written to a shard."""
+        return next(iter(self.stats.values())).count
+
+    def is_completed(self, game: int):
+        """Whether a game has been written out to a shard."""
+        byte = game >> 3
+        return byte < len(self._completed) and bool(
+            self._completed[byte] >> (game & 7) & 1
+        )
+
+    def add(self, row: dict[str, Any]):
+        """Add one game's result, writing a shard once enough have been added.
+
+        Rows must have a "game" number, used to skip the game after a resume.
+        """
+        for column, stats in self.stats.items():
+            stats.add(row[column])
+        self._rows.append(row)
+        if len(self._rows) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """Write out every buffered game as a shard and save the running state."""
+        if not self._rows:
+            return
+
+        # Only imported when writing, so pool workers don't pay for it on start
+        import pandas as pd
+
+        # Shards are complete before the state that refers to them is saved, so a
+        # crash part way through only loses the buffered games
+        df = pd.DataFrame(self._rows)
+        temp_path = self.path / f"shard.{self.shard_format}.tmp"
+        if self.shard_format == "csv":
+            df.to_csv(temp_path, index=False)
+        else:
+            df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, self._shard_path(self.shards))
+        self.shards += 1
+
+        for row in self._rows:
+            byte = row["game"] >> 3
+            if byte >= len(self._completed):
+                self._completed.extend(bytes(byte + 1 - len(self._completed)))
+            self._completed[byte] |= 1 << (row["game"] & 7)
+        self._rows.clear()
+        self._save()
+
+    def _save(self):
+        # Everything goes in one file so the state saved is always consistent
+        state = {
+            "shards": self.shards,
+            "shard_format": self.shard_format,
+            "stats": {column: stats.to_dict() for column, stats in self.stats.items()},
+            "completed": base64.b64encode(self._completed).decode(),
+        }
+        _write_atomic(self._state_path, json.dumps(state).encode())
+
+    def _load(self):
+        state = json.loads(self._state_path.read_text())
+        if state["shard_format"] != self.shard_format:
+            raise Exception(
+                f"Existing shards in {self.path} are not {self.shard_format}"
+            )
+        self.shards = state["shards"]
+        self.stats = {
+            column: RunningStats.from_dict(data)
+            for column, data in state["stats"].items()
+        }
+        self._completed = bytearray(base64.b64decode(state["completed"]))
+
+        # Games in a shard written after the last save are played again, so drop it
+        self._shard_path(self.shards).unlink(missing_ok=True)
+
+    def read(self):
+        """Load every shard written so far into one DataFrame."""
+        import pandas as pd
+
+        read_shard = pd.read_csv if self.shard_format == "csv" else pd.read_parquet
+        return pd.concat(
+            [read_shard(self._shard_path(shard)) for shard in range(self.shards)],
+            ignore_index=True,
+        )
@@ -0,0 +1,154 @@
+from time import perf_counter
+from typing import NamedTuple
+from harmonies_ai.ai.greedy import Turn, apply_turn, score_next_turns
+from harmonies_ai.bitboard import water_score
+from harmonies_ai.game_state import GameState
+from harmonies_ai.tokens import Stack, Token
+
+
+class SearchStats(NamedTuple):
+    depth: int
+    nodes: int
+    pruned: int
+    seconds: float
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def score_upper_bound(gs: GameState, turns: int):
+    """Optimistic total score after the given number of further turns.
+
+    Each turn places three tokens, so each component is bounded by what that
+    many more tokens could possibly add to the current board.
+    """
+    board = gs.board
+    tokens = 3 * turns
+    # New gray, yellow and blue stacks can only be started on empty cells
+    new_stacks = min(tokens, board.mask(Stack.EMPTY0).bit_count())
+
+    # Only green tokens score trees, at most 7 each by finishing a TREES3
+    tree_spots = board.mask(Stack.EMPTY0) | board.placement_mask(Token.GRN)
+    trees = board.trees + 7 * min(tokens, tree_spots.bit_count())
+    # Every gray topped stack scores at most 7
+    mountains = 7 * (board.top_mask(Token.GRY).bit_count() + new_stacks)
+    # Each yellow token can make at most one new group of two or more
+    fields = board.fields + 5 * new_stacks
+    # Each new building needs a red token, and scores at most once
+    new_buildings = min(tokens, board.placement_mask(Token.RED).bit_count())
+    buildings = 5 * (board.mask(Stack.BUILD2).bit_count() + new_buildings)
+    # The longest river can't be longer than every water cell put together
+    water = water_score(board.mask(Stack.WATER1).bit_count() + new_stacks)
+
+    return trees + mountains + fields + buildings + water
+
+
+class BeamSearch:
+    """Expectimax over the top turns by immediate score, with sampled refills.
+
+    Each ply keeps the `width` best turns by immediate score, averages over
+    `samples` random display refills, and skips turns whose optimistic bound
+    can't beat the best value already found. Depths are searched one after the
+    other until the time limit, keeping the deepest completed result.
+    """
+
+    stats: SearchStats | None
+
+    def __init__(
+        self,
+        width: int = 4,
+        depth: int = 2,
+        samples: int = 4,
+        seconds: float | None = None,
+    ):
+        self.width = width
+        self.depth = depth
+        self.samples = samples
+        self.seconds = seconds
+        self.stats = None
+        self._deadline = float("inf")
+        self._nodes = 0
+        self._pruned = 0
+
+    def _check_time(self):
+        if perf_counter() > self._deadline:
+            raise _OutOfTime()
+
+    def _expected_value(self, gs: GameState, turns: int) -> float:
+        """Value after placing a turn's tokens, averaged over display refills."""
+        self._nodes += 1
+        if turns == 0 or gs.board.mask(Stack.EMPTY0).bit_count() <= 2:
+            return gs.running_score.total
+
+        total = 0.0
+        for _ in range(self.samples):
+            with gs.explore():
+                gs.end_turn()
+                total += self._best_value(gs, turns)
+        return total / self.samples
+
+    def _best_value(self, gs: GameState, turns: int):
+        """Value of the best turn from a position with the display refilled."""
+        self._check_time()
+        if gs.game_ended:
+            return gs.running_score.total
+
+        next_turns, totals = score_next_turns(gs)
+        if turns == 1:
+            return float(totals.max())
+
+        best = float("-inf")
+        for i in (-totals).argsort()[: self.width]:
+            with gs.explore():
+                apply_turn(gs, next_turns[i])
+                if score_upper_bound(gs, turns - 1) <= best:
+                    self._pruned += 1
+                    continue
+                best = max(best, self._expected_value(gs, turns - 1))
+        return best
+
+    def _search_depth(self, gs: GameState, turns: list[Turn], order, depth: int):
+        best_turn, best = turns[order[0]], float("-inf")
+        for i in order[: self.width]:
+            with gs.explore():
+                apply_turn(gs, turns[i])
+                if score_upper_bound(gs, depth - 1) <= best:
+                    self._pruned += 1
+                    continue
+                value = self._expected_value(gs, depth - 1)
+            if value > best:
+                best_turn, best = turns[i], value
+        return best_turn
+
+    def search(self, gs: GameState):
+        """Return the turn with the best expected value at the deepest depth reached."""
+        start = perf_counter()
+        self._deadline = start + self.seconds if self.seconds else float("inf")
+        self._nodes = self._pruned = 0
+
+        turns, totals = score_next_turns(gs)
+        order = (-totals).argsort()
+        best_turn, depth_reached = turns[order[0]], 1
+
+        for depth in range(2, self.depth + 1):
+            try:
+                best_turn = self._search_depth(gs, turns, order, depth)
+            except _OutOfTime:
+                break
+            depth_reached = depth
+
+        self.stats = SearchStats(
+            depth=depth_reached,
+            nodes=self._nodes,
+            pruned=self._pruned,
+            seconds=perf_counter() - start,
+        )
+        return best_turn
+
+
+def simulate_game(gs: GameState, beam: BeamSearch | None = None):
+    beam = beam or BeamSearch(seconds=2.0)
+    while not gs.game_ended:
+        apply_turn(gs, beam.search(gs)).end_turn()
+    return gs
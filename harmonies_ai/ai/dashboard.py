@@ -0,0 +1,162 @@
+import heapq
+from time import perf_counter
+from typing import TYPE_CHECKING
+from rich.console import Console, Group
+from rich.live import Live
+from rich.table import Table
+from harmonies_ai.aggregate import RunningStats
+from harmonies_ai.record import GameRecord
+
+if TYPE_CHECKING:
+    from harmonies_ai.ai.runner import GameResult
+
+
+_spark_chars = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(stats: RunningStats, bins: int = 20):
+    """Histogram of the values seen so far as a row of block characters."""
+    if not stats.count:
+        return ""
+    low, high = stats.min, stats.max
+    width = (high - low) / bins or 1
+    counts = [0] * bins
+    for value, count in stats.histogram.items():
+        counts[min(int((value - low) / width), bins - 1)] += count
+    top = max(counts)
+    return "".join(
+        _spark_chars[round(count / top * (len(_spark_chars) - 1))] if count else " "
+        for count in counts
+    )
+
+
+class Dashboard:
+    """Live view of a self-play run, fed results in the parent process.
+
+    Workers only send back their results, turn timings and encoded actions, so
+    all rendering happens here. The display redraws `refresh_rate` times a
+    second, so the elapsed time and rates keep moving between results, while
+    the tables are rebuilt at most that often as results arrive. The sample
+    board is replayed from a recent game's actions every `sample_seconds`.
+    """
+
+    def __init__(
+        self,
+        summary: dict[str, RunningStats],
+        games: int,
+        console: Console | None = None,
+        refresh_rate: float = 4.0,
+        sample_seconds: float = 5.0,
+        slowest: int = 5,
+    ):
+        self.summary = summary
+        self.games = games
+        self.refresh_interval = 1 / refresh_rate
+        self.sample_seconds = sample_seconds
+        self.slowest = slowest
+
+        self.played = 0
+        self.worker_games: dict[int, int] = {}
+        self.slowest_turns: list[tuple[float, int, int]] = []
+        self.sample = None
+        self.sample_game = None
+
+        self._start = perf_counter()
+        self._last_refresh = float("-inf")
+        self._last_sample = float("-inf")
+        # What the live view shows, replaced whole as results arrive, since
+        # Live redraws from its own thread
+        self._shown_played = 0
+        self._shown_workers: list[tuple[int, int]] = []
+        self._shown_turns = Table()
+        self._shown_rest: list = []
+        self._rebuild()
+        self._live = Live(
+            console=console,
+            refresh_per_second=refresh_rate,
+            get_renderable=self._renderable,
+        )
+
+    def __enter__(self):
+        self._start = perf_counter()
+        self._live.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._rebuild()
+        self._live.refresh()
+        self._live.__exit__(*exc_info)
+
+    def update(self, result: "GameResult"):
+        self.played += 1
+        self.worker_games[result.worker] = self.worker_games.get(result.worker, 0) + 1
+        for record in result.turn_log or ():
+            entry = (record["seconds"], result.game, record["turn"])
+            if len(self.slowest_turns) < self.slowest:
+                heapq.heappush(self.slowest_turns, entry)
+            else:
+                heapq.heappushpop(self.slowest_turns, entry)
+        # Counts are cheap to show, so they are kept current with every result
+        self._shown_played = self.played
+        self._shown_workers = sorted(self.worker_games.items())
+
+        now = perf_counter()
+        if (
+            result.actions is not None
+            and now - self._last_sample >= self.sample_seconds
+        ):
+            self.sample = GameRecord(result.seed, result.actions).replay()
+            self.sample_game = result.game
+            self._last_sample = now
+        if now - self._last_refresh >= self.refresh_interval:
+            self._rebuild()
+            self._last_refresh = now
+
+    def render(self):
+        self._rebuild()
+        return self._renderable()
+
+    def _renderable(self):
+        elapsed = perf_counter() - self._start
+        played = self._shown_played
+
+        workers = Table(
+            title=f"{played}/{self.games} games in {elapsed:.0f}s"
+            f" ({played / elapsed:.1f} games/s)"
+        )
+        workers.add_column("worker")
+        workers.add_column("games", justify="right")
+        workers.add_column("games/s", justify="right")
+        for worker, games in self._shown_workers:
+            workers.add_row(str(worker), str(games), f"{games / elapsed:.2f}")
+
+        top = Table.grid(padding=(0, 2))
+        top.add_row(workers, self._shown_turns)
+        return Group(top, *self._shown_rest)
+
+    def _rebuild(self):
+        scores = Table(title="Scores")
+        scores.add_column("component")
+        scores.add_column("mean", justify="right")
+        scores.add_column("std", justify="right")
+        scores.add_column("distribution", no_wrap=True)
+        for name, stats in self.summary.items():
+            scores.add_row(
+                name, f"{stats.mean:.2f}", f"{stats.std:.2f}", sparkline(stats)
+            )
+
+        turns = Table(title="Slowest turns")
+        turns.add_column("game", justify="right")
+        turns.add_column("turn", justify="right")
+        turns.add_column("seconds", justify="right")
+        for seconds, game, turn in sorted(self.slowest_turns, reverse=True):
+            turns.add_row(str(game), str(turn), f"{seconds:.3f}")
+
+        rest = [scores]
+        if self.sample is not None:
+            rest += [f"Game {self.sample_game}", self.sample]
+
+        self._shown_played = self.played
+        self._shown_workers = sorted(self.worker_games.items())
+        self._shown_turns = turns
+        self._shown_rest = rest
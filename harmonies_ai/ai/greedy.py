@@ -1,6 +1,16 @@
-from harmonies_ai.game_state import GameState
-from harmonies_ai.tokens import Token
-from itertools import product
+import numpy as np
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Iterator
+from harmonies_ai import instrument
+from harmonies_ai.ai.transposition import TranspositionTable
+from harmonies_ai.batch_score import score_batch
+from harmonies_ai.bitboard import iter_bits
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import Action, DiscardCardAction, GameState
+from harmonies_ai.game_state import PlaceCubeAction, PlaceTokenAction, TakeCardAction
+from harmonies_ai.grid import GridPosition, grid_size
+from harmonies_ai.tokens import Stack, Token
 
 
 # TODO maybe move into the enum itself
@@ -18,48 +28,417 @@ def sort_by_placement_priority(tokens: tuple[Token, ...]):
     return tuple(sorted(tokens, key=lambda t: _placement_priority.index(t)))
 
 
-def has_conflict(gs: GameState, turn: tuple[tuple[Token, int]]):
-    updated_stacks = {}
-    for token, pos in turn:
-        stack = updated_stacks.get(pos, gs.board[pos])
+Turn = tuple[tuple[Token, GridPosition], ...]
+
+
+def _enumerate_turn(
+    gs: GameState,
+    tokens: tuple[Token, ...],
+    spots: dict[Token, tuple[GridPosition, ...]],
+    turn: Turn,
+    updated: dict[GridPosition, Stack],
+) -> Iterator[tuple[Turn, dict[GridPosition, Stack]]]:
+    if len(turn) == len(tokens):
+        yield turn, updated
+        return
+
+    token = tokens[len(turn)]
+    # Identical tokens are placed in position order so each board is only built once
+    min_pos = turn[-1][1] if turn and turn[-1][0] == token else 0
+
+    candidates = set(spots[token]).union(updated)
+    for pos in sorted(candidates):
+        if pos < min_pos:
+            continue
+        stack = updated.get(pos, gs.board[pos])
         if token not in stack.placements:
-            return True
-        updated_stacks[pos] = stack.placements[token]
+            if instrument.enabled:
+                instrument.count("conflicts_rejected")
+            continue
+        yield from _enumerate_turn(
+            gs,
+            tokens,
+            spots,
+            turn + ((token, pos),),
+            {**updated, pos: stack.placements[token]},
+        )
+
+
+def _distinct_turns(gs: GameState):
+    spots = {token: gs.legal_token_positions(token) for token in Token}
+    seen = set()
+
+    for tokens in dict.fromkeys(gs.display_tokens):
+        sorted_tokens = sort_by_placement_priority(tokens)
+        for turn, updated in _enumerate_turn(gs, sorted_tokens, spots, (), {}):
+            board_key = tuple(sorted((pos, s.index) for pos, s in updated.items()))
+            if board_key in seen:
+                if instrument.enabled:
+                    instrument.count("duplicates_rejected")
+                continue
+            seen.add(board_key)
+            if instrument.enabled:
+                instrument.count("states_generated")
+            yield turn, updated
+
+
+def get_next_turns(gs: GameState):
+    """Yield one turn of token placements for every distinct resulting board."""
+    return (turn for turn, _ in _distinct_turns(gs))
+
+
+def score_next_turns(gs: GameState, table: TranspositionTable | None = None):
+    """Return every distinct next turn and the total score of each resulting board.
+
+    With a table, boards already evaluated are looked up by Zobrist key and only
+    the rest are scored.
+    """
+    turns: list[Turn] = []
+    keys: list[int] = []
+    totals: list[float | None] = []
+    rows: list[int] = []
+    positions: list[GridPosition] = []
+    stacks: list[int] = []
+
+    for turn, updated in _distinct_turns(gs):
+        turns.append(turn)
+        if table is not None:
+            keys.append(gs.board.key_with(updated))
+            totals.append(table.lookup(keys[-1]))
+            if totals[-1] is not None:
+                continue
+        row = len(turns) - 1
+        for pos, stack in updated.items():
+            rows.append(row)
+            positions.append(pos)
+            stacks.append(stack.index)
+
+    boards = np.tile([stack.index for stack in gs.board], (len(turns), 1))
+    boards[rows, positions] = stacks
+    if table is None:
+        return turns, score_batch(boards).sum(axis=1)
+
+    missing = [row for row, total in enumerate(totals) if total is None]
+    scored = score_batch(boards[missing]).sum(axis=1)
+    for row, total in zip(missing, scored.tolist()):
+        totals[row] = total
+        table.store(keys[row], 0, total)
+    return turns, np.array(totals)
+
+
+def next_turn_boards(gs: GameState):
+    """Return every distinct next turn and the stack indices of each resulting board."""
+    turns: list[Turn] = []
+    rows: list[int] = []
+    positions: list[GridPosition] = []
+    stacks: list[int] = []
+    for row, (turn, updated) in enumerate(_distinct_turns(gs)):
+        turns.append(turn)
+        for pos, stack in updated.items():
+            rows.append(row)
+            positions.append(pos)
+            stacks.append(stack.index)
+
+    boards = np.tile([stack.index for stack in gs.board], (len(turns), 1))
+    boards[rows, positions] = stacks
+    return turns, boards
+
+
+def apply_turn(gs: GameState, turn: Turn):
+    for token, pos in turn:
+        gs.place_token(token, pos)
+    return gs
 
 
 def get_next_states(gs: GameState):
-    token_spots = {
-        token: tuple(
-            pos
-            for pos, stack in enumerate(gs.board)
-            if token in stack.placements and not gs.cubes[pos]
+    for turn in get_next_turns(gs):
+        yield apply_turn(gs.copy(), turn)
+
+
+def score_turn(gs: GameState, turn: Turn):
+    with gs.explore():
+        return apply_turn(gs, turn).running_score.total
+
+
+# A whole turn's actions, tokens first, then any card taken or discarded, then cubes
+FullTurn = tuple[Action, ...]
+
+CubePlacement = tuple[AnimalCard, GridPosition]
+
+
+def _card_actions(gs: GameState) -> list[Action | None]:
+    # Any display card can be discarded, but only taken while the hand has room
+    takes = []
+    if len(gs.cards) < 4:
+        takes = [TakeCardAction(card) for card in gs.display_cards]
+    return [None, *takes, *(DiscardCardAction(card) for card in gs.display_cards)]
+
+
+def _cube_sets(
+    placements: list[CubePlacement],
+    cubes_left: dict[AnimalCard, int],
+    start: int = 0,
+    used: int = 0,
+) -> Iterator[tuple[CubePlacement, ...]]:
+    """Every set of placements with each position used once, within cubes left."""
+    yield ()
+    for i in range(start, len(placements)):
+        card, pos = placements[i]
+        if used >> pos & 1 or not cubes_left[card]:
+            continue
+        cubes_left[card] -= 1
+        for rest in _cube_sets(placements, cubes_left, i + 1, used | 1 << pos):
+            yield ((card, pos), *rest)
+        cubes_left[card] += 1
+
+
+def _best_cubes(placements: list[CubePlacement], cubes_left: dict[AnimalCard, int]):
+    """The most card points gained from the placements, and the cubes to place.
+
+    Each set is bounded by the points for placing every placement still left,
+    so branches that can't beat the best set found are skipped.
+    """
+    best: tuple[int, tuple[CubePlacement, ...]] = (0, ())
+
+    def search(start: int, used: int, gain: int, chosen: tuple[CubePlacement, ...]):
+        nonlocal best
+        if gain > best[0]:
+            best = (gain, chosen)
+        remaining = Counter(card for card, _ in placements[start:])
+        bound = gain + sum(
+            card.points(max(cubes_left[card] - n, 0)) - card.points(cubes_left[card])
+            for card, n in remaining.items()
         )
-        for token in Token
-    }
+        if bound <= best[0]:
+            return
+        for i in range(start, len(placements)):
+            card, pos = placements[i]
+            if used >> pos & 1 or not cubes_left[card]:
+                continue
+            before = card.points(cubes_left[card])
+            cubes_left[card] -= 1
+            step = card.points(cubes_left[card]) - before
+            search(i + 1, used | 1 << pos, gain + step, (*chosen, (card, pos)))
+            cubes_left[card] += 1
 
-    turns = set()
+    search(0, 0, 0, ())
+    return best
 
-    for tokens in set(gs.display_tokens):
-        sorted_tokens = sort_by_placement_priority(tokens)
-        turns.update(
-            product(
-                *[
-                    [(token, pos) for pos in token_spots[token]]
-                    for token in sorted_tokens
-                ]
-            )
+
+def _card_gain_bound(gs: GameState):
+    """Most card points a turn could gain, ignoring card requirements.
+
+    Each card can only get cubes on stacks of its base, and a turn's tokens can
+    make at most three more of those.
+    """
+    open_mask = ~gs.board.cube_mask
+
+    def gain(card: AnimalCard, cubes_left: int):
+        spots = (gs.board.mask(card.base) & open_mask).bit_count() + 3
+        return card.points(max(cubes_left - spots, 0)) - card.points(cubes_left)
+
+    held = sum(gain(card, cubes_left) for card, cubes_left in gs.cards.items())
+    taken = 0
+    if len(gs.cards) < 4:
+        taken = max(gain(card, card.num_cubes) for card in gs.display_cards)
+    return held + taken
+
+
+def _token_actions(turn: Turn) -> FullTurn:
+    return tuple(PlaceTokenAction(token, pos) for token, pos in turn)
+
+
+def _cube_actions(cubes: tuple[CubePlacement, ...]) -> FullTurn:
+    return tuple(PlaceCubeAction(card, pos) for card, pos in cubes)
+
+
+def get_legal_turns(gs: GameState) -> Iterator[FullTurn]:
+    """Yield every legal turn, including cards taken or discarded and cubes placed.
+
+    Token placements are ordered by the board score they lead to, best first.
+    """
+    turns, totals = score_next_turns(gs)
+    for i in (-totals).argsort():
+        legal = []
+        with gs.explore():
+            apply_turn(gs, turns[i])
+            for card_action in _card_actions(gs):
+                with gs.explore():
+                    if card_action is not None:
+                        gs.apply(card_action)
+                    cubes_left = dict(gs.cards)
+                    for cubes in _cube_sets(gs.legal_cube_placements(), cubes_left):
+                        card_actions = () if card_action is None else (card_action,)
+                        legal.append(
+                            _token_actions(turns[i])
+                            + card_actions
+                            + _cube_actions(cubes)
+                        )
+        yield from legal
+
+
+@lru_cache(maxsize=None)
+def _cube_affects(card: AnimalCard) -> tuple[int, ...]:
+    """Maps each cell to a mask of the base positions whose cube it could affect."""
+    affects = [0] * grid_size
+    for pos, patterns in enumerate(card.patterns):
+        support = 1 << pos
+        for pattern in patterns:
+            for _, mask in pattern:
+                support |= mask
+        for cell in iter_bits(support):
+            affects[cell] |= 1 << pos
+    return tuple(affects)
+
+
+def _cube_positions(card: AnimalCard, masks: list[int], candidates: int):
+    """Mask of the candidate positions where the card's requirements are met."""
+    result = 0
+    for pos in iter_bits(candidates & masks[card.base.index]):
+        if any(
+            all(masks[index] & mask == mask for index, mask in pattern)
+            for pattern in card.patterns[pos]
+        ):
+            result |= 1 << pos
+    return result
+
+
+def best_legal_turn(
+    gs: GameState, table: TranspositionTable | None = None, width: int | None = None
+):
+    """Return the legal turn with the highest total score, and that total.
+
+    Token placements are tried best board score first, and stop once even the
+    most card points a turn could gain can't catch up with the best turn found.
+    Where cubes can go is worked out once for the current board, and only
+    rechecked around the cells each turn's tokens change. Given a width, cards
+    and cubes are only tried with that many of the best token placements.
+    Discarding a card never scores, so discards aren't tried.
+    """
+    turns, totals = score_next_turns(gs, table)
+    card_points = sum(gs.card_points())
+    gain_bound = _card_gain_bound(gs)
+
+    board = gs.board
+    open_mask = ~board.cube_mask
+    options: list[tuple[TakeCardAction | None, tuple[AnimalCard, ...]]] = [
+        (None, tuple(gs.cards))
+    ]
+    if len(gs.cards) < 4:
+        options += [
+            (TakeCardAction(card), (*gs.cards, card)) for card in gs.display_cards
+        ]
+    # Cards are numbered for the loop below, as hashing enum members is slow
+    cards = list(
+        dict.fromkeys(card for _, option_cards in options for card in option_cards)
+    )
+    option_indices = [
+        (card_action, [cards.index(card) for card in option_cards])
+        for card_action, option_cards in options
+    ]
+    affects = [_cube_affects(card) for card in cards]
+    before = [_cube_positions(card, board.masks, open_mask) for card in cards]
+    bases = [board.mask(card.base) & open_mask for card in cards]
+    # Card points gained by placing cubes on as many positions as there are
+    cube_gains = []
+    for card in cards:
+        cubes_left = gs.cards.get(card, card.num_cubes)
+        cube_gains.append(
+            [
+                card.points(max(cubes_left - spots, 0)) - card.points(cubes_left)
+                for spots in range(grid_size + 1)
+            ]
         )
+    gains: dict[tuple, tuple[int, tuple[CubePlacement, ...]]] = {}
+
+    best_total, best_turn = float("-inf"), ()
+    unaffected_seen = False
+    for i in (-totals).argsort()[:width]:
+        board_total = float(totals[i])
+        if board_total + card_points + gain_bound <= best_total:
+            break
 
-    for turn in turns:
-        if not has_conflict(gs, turn):
-            yield gs.copy().place_token(*turn[0]).place_token(*turn[1]).place_token(
-                *turn[2]
+        turn = turns[i]
+        touched = 0
+        for _, pos in turn:
+            touched |= 1 << pos
+        affected = []
+        for card_affects in affects:
+            mask = 0
+            for _, pos in turn:
+                mask |= card_affects[pos]
+            affected.append(mask)
+        if not any(affected):
+            # Cubes go where they could before the turn, which only the first
+            # such turn, with the best board score, needs to check
+            if unaffected_seen:
+                continue
+            unaffected_seen = True
+        else:
+            # Cubes can only newly go on stacks of the card's base, which the
+            # turn's tokens can add at most on the cells they touch
+            turn_bound = max(
+                sum(
+                    cube_gains[c][
+                        (before[c] | affected[c] & (bases[c] | touched)).bit_count()
+                    ]
+                    for c in indices
+                )
+                for _, indices in option_indices
             )
+            if board_total + card_points + turn_bound <= best_total:
+                continue
+
+        positions = before
+        masks = None
+        for c, mask in enumerate(affected):
+            if not mask:
+                continue
+            if masks is None:
+                positions = before.copy()
+                masks = list(board.masks)
+                stacks = {}
+                for token, pos in turn:
+                    stack = stacks.get(pos, board[pos])
+                    stacks[pos] = stack.placements[token]
+                for pos, stack in stacks.items():
+                    masks[board[pos].index] &= ~(1 << pos)
+                    masks[stack.index] |= 1 << pos
+            positions[c] = (before[c] & ~mask) | _cube_positions(
+                cards[c], masks, mask & open_mask
+            )
+
+        for card_action, indices in option_indices:
+            key = (id(indices), *[positions[c] for c in indices])
+            if key not in gains:
+                cubes_left = {
+                    cards[c]: gs.cards.get(cards[c], cards[c].num_cubes)
+                    for c in indices
+                }
+                placements = [
+                    (cards[c], pos) for c in indices for pos in iter_bits(positions[c])
+                ]
+                gains[key] = _best_cubes(placements, cubes_left)
+            gain, cubes = gains[key]
+            total = board_total + card_points + gain
+            if total > best_total:
+                card_actions = () if card_action is None else (card_action,)
+                best_total = total
+                best_turn = _token_actions(turn) + card_actions + _cube_actions(cubes)
+
+    return best_turn, best_total
+
+
+def apply_actions(gs: GameState, actions: Iterable[Action]):
+    for action in actions:
+        gs.apply(action)
+    return gs
 
 
-def simulate_game(gs: GameState):
+def simulate_game(
+    gs: GameState, table: TranspositionTable | None = None, width: int | None = 256
+):
     while not gs.game_ended:
-        next_states = get_next_states(gs)
-        gs = max(next_states, key=lambda s: s.score.total)
-        gs.end_turn()
+        turn, _ = best_legal_turn(gs, table, width)
+        apply_actions(gs, turn).end_turn()
     return gs
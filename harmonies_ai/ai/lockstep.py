@@ -0,0 +1,110 @@
+import numpy as np
+from harmonies_ai.batch_score import score_batch
+from harmonies_ai.game_state import initial_supply
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+_tokens = tuple(Token)
+
+# Stack made by placing each token on each stack, or -1 where it can't go
+_next_stack = np.full((len(Stack), len(_tokens)), -1, dtype=np.int8)
+for _stack in Stack:
+    for _token, _above in _stack.placements.items():
+        _next_stack[_stack.index, _tokens.index(_token)] = _above.index
+
+# Display tokens are placed in name order, as GameState sorts them, so that
+# tokens placed on each other in one turn stack the same way
+_by_name = np.array(sorted(range(len(_tokens)), key=lambda i: _tokens[i].name))
+_name_rank = np.argsort(_by_name)
+
+_initial_supply = np.array([initial_supply[token] for token in _tokens])
+_empty_index = Stack.EMPTY0.index
+
+
+class LockstepGames:
+    """Random games played together, one turn at a time, as NumPy arrays.
+
+    Each game's board, token supply and display are rows of arrays, so every
+    step of a turn is done for all games still playing at once. The games
+    follow the rules and choices of the random AI, but draw from a NumPy
+    generator, so they match it in distribution rather than game by game.
+    """
+
+    # Stack index at each position of each board
+    boards: np.ndarray
+    # Tokens left in each game's supply, by token index
+    supply: np.ndarray
+    # Three sets of three token indices on display, each in placement order
+    display: np.ndarray
+    turns: np.ndarray
+    ended: np.ndarray
+
+    def __init__(self, games: int, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.full((games, grid_size), _empty_index, dtype=np.int8)
+        self.supply = np.tile(_initial_supply, (games, 1))
+        self.display = np.zeros((games, 3, 3), dtype=np.int8)
+        self.turns = np.zeros(games, dtype=np.int64)
+        self.ended = np.zeros(games, dtype=bool)
+        self._refresh_display(np.arange(games))
+
+    def __len__(self):
+        return len(self.boards)
+
+    def _draw_tokens(self, supply: np.ndarray, count: int):
+        # Each draw picks a token with probability proportional to how many are left
+        drawn = np.empty((len(supply), count), dtype=np.int8)
+        for i in range(count):
+            cumulative = supply.cumsum(axis=1)
+            draw = (self.rng.random(len(supply)) * cumulative[:, -1]).astype(np.int64)
+            tokens = (cumulative <= draw[:, None]).sum(axis=1)
+            supply[np.arange(len(supply)), tokens] -= 1
+            drawn[:, i] = tokens
+        return drawn
+
+    def _refresh_display(self, games: np.ndarray):
+        supply = self.supply[games]
+        can_draw = supply.sum(axis=1) >= 9
+        self.ended[games[~can_draw]] = True
+        games, supply = games[can_draw], supply[can_draw]
+
+        drawn = self._draw_tokens(supply, 9).reshape(-1, 3, 3)
+        self.display[games] = _by_name[np.sort(_name_rank[drawn], axis=2)]
+        self.supply[games] = supply
+
+    def step(self):
+        """Play one turn of every game that hasn't ended."""
+        games = np.flatnonzero(~self.ended)
+        boards = self.boards[games]
+        rows = np.arange(len(games))
+
+        chosen = self.display[games, self.rng.integers(3, size=len(games))]
+        for i in range(3):
+            # Every position the token can go on is equally likely
+            next_stacks = _next_stack[boards, chosen[:, i, None]]
+            weights = self.rng.random(next_stacks.shape, dtype=np.float32)
+            pos = np.where(next_stacks >= 0, weights, -1).argmax(axis=1)
+            boards[rows, pos] = next_stacks[rows, pos]
+
+        self.boards[games] = boards
+        self.turns[games] += 1
+        self._refresh_display(games)
+        self.ended[games[(boards == _empty_index).sum(axis=1) <= 2]] = True
+        return self
+
+    def run(self):
+        """Play every game to the end."""
+        while not self.ended.all():
+            self.step()
+        return self
+
+    def score(self):
+        """Score columns of every board, as returned by score_batch."""
+        return score_batch(self.boards)
+
+
+def simulate_games(games: int, seed=None):
+    """Play random games in lockstep, returning their score columns and turns."""
+    lockstep = LockstepGames(games, seed).run()
+    return lockstep.score(), lockstep.turns
@@ -0,0 +1,201 @@
+from math import log, sqrt
+from random import Random
+from time import perf_counter
+from typing import NamedTuple
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.ai.greedy import Turn, apply_turn, score_next_turns
+from harmonies_ai.ai.greedy import sort_by_placement_priority
+from harmonies_ai.bitboard import iter_bits
+from harmonies_ai.game_state import GameState
+from harmonies_ai.tokens import Token
+
+
+class SearchStats(NamedTuple):
+    iterations: int
+    seconds: float
+    tree_size: int
+    reused_size: int
+
+    @property
+    def iterations_per_second(self):
+        return self.iterations / self.seconds if self.seconds else 0.0
+
+
+class DecisionNode:
+    """Position at the start of a turn, shared by every display refill.
+
+    The board only depends on the turns that led here, so children are kept for
+    any refill and only those using a token group on the current display are
+    considered.
+    """
+
+    visits: int
+    children: dict[Turn, "ChanceNode"]
+
+    def __init__(self):
+        self.visits = 0
+        self.children = {}
+
+    @property
+    def size(self) -> int:
+        return 1 + sum(child.size for child in self.children.values())
+
+
+class ChanceNode:
+    """Position after a turn's tokens are placed, refilling the display on visit."""
+
+    turn: Turn
+    group: tuple[Token, ...]
+    visits: int
+    total: float
+    child: DecisionNode
+
+    def __init__(self, turn: Turn):
+        self.turn = turn
+        self.group = tuple(sorted(token for token, _ in turn))
+        self.visits = 0
+        self.total = 0.0
+        self.child = DecisionNode()
+
+    @property
+    def size(self) -> int:
+        return 1 + self.child.size
+
+
+def sample_turns(gs: GameState, rng: Random, samples: int):
+    """Sample random turns, best immediate score first."""
+    scored = dict[Turn, int]()
+    for _ in range(samples):
+        turn = []
+        for token in sort_by_placement_priority(rng.choice(gs.display_tokens)):
+            pos = rng.choice(tuple(iter_bits(gs.board.placement_mask(token))))
+            gs.place_token(token, pos)
+            turn.append((token, pos))
+        scored[tuple(turn)] = gs.running_score.total
+        for _ in turn:
+            gs.undo()
+    return sorted(scored, key=scored.__getitem__, reverse=True)
+
+
+class Mcts:
+    """Monte Carlo tree search with display refills as chance nodes.
+
+    Root turns are the best by immediate score out of every distinct turn, deeper
+    turns are the best out of a random sample, and leaves are valued by playing
+    the rest of the game out with the random AI. The subtree below the turn that
+    was played is kept for the next search.
+    """
+
+    root: DecisionNode | None
+    stats: SearchStats | None
+
+    def __init__(
+        self,
+        seconds: float | None = 1.0,
+        iterations: int | None = None,
+        branching: int = 16,
+        samples: int = 16,
+        exploration: float = 0.5,
+    ):
+        if seconds is None and iterations is None:
+            raise Exception("MCTS needs a time or iteration budget")
+        self.seconds = seconds
+        self.iterations = iterations
+        self.branching = branching
+        self.samples = samples
+        self.exploration = exploration
+        self.root = None
+        self.stats = None
+        self._best_total = 1.0
+
+    def _untried_turn(self, gs: GameState, node: DecisionNode, root_turns: list[Turn]):
+        candidates = (
+            root_turns if node is self.root else sample_turns(gs, gs.rng, self.samples)
+        )
+        return next((turn for turn in candidates if turn not in node.children), None)
+
+    def _select(self, node: DecisionNode, available: list[ChanceNode]):
+        scale = self._best_total
+        log_visits = log(node.visits)
+        return max(
+            available,
+            key=lambda chance: chance.total / chance.visits / scale
+            + self.exploration * sqrt(log_visits / chance.visits),
+        )
+
+    def _iterate(self, gs: GameState, root_turns: list[Turn]):
+        node = self.root
+        path: list[DecisionNode | ChanceNode] = [node]
+
+        with gs.explore():
+            while not gs.game_ended:
+                groups = set(gs.display_tokens)
+                available = [c for c in node.children.values() if c.group in groups]
+
+                turn = None
+                if len(available) < self.branching:
+                    turn = self._untried_turn(gs, node, root_turns)
+
+                if turn is not None:
+                    chance = node.children[turn] = ChanceNode(turn)
+                    apply_turn(gs, turn).end_turn()
+                    path += [chance, chance.child]
+                    random_ai.simulate_game(gs)
+                    break
+
+                chance = self._select(node, available)
+                apply_turn(gs, chance.turn).end_turn()
+                node = chance.child
+                path += [chance, node]
+
+            total = gs.score.total
+
+        self._best_total = max(self._best_total, total)
+        for visited in path:
+            visited.visits += 1
+            if isinstance(visited, ChanceNode):
+                visited.total += total
+
+    def search(self, gs: GameState):
+        """Search from the given state and return the most visited turn."""
+        start = perf_counter()
+        if self.root is None:
+            self.root = DecisionNode()
+        reused_size = self.root.size - 1
+
+        turns, totals = score_next_turns(gs)
+        root_turns = [turns[i] for i in (-totals).argsort()]
+
+        iterations = 0
+        while iterations == 0 or (
+            (self.iterations is None or iterations < self.iterations)
+            and (self.seconds is None or perf_counter() - start < self.seconds)
+        ):
+            self._iterate(gs, root_turns)
+            iterations += 1
+
+        self.stats = SearchStats(
+            iterations=iterations,
+            seconds=perf_counter() - start,
+            tree_size=self.root.size,
+            reused_size=reused_size,
+        )
+        groups = set(gs.display_tokens)
+        return max(
+            (turn for turn, c in self.root.children.items() if c.group in groups),
+            key=lambda turn: self.root.children[turn].visits,
+        )
+
+    def advance(self, turn: Turn):
+        """Keep the subtree below the turn that was played."""
+        chance = self.root.children.get(turn) if self.root else None
+        self.root = chance.child if chance else None
+
+
+def simulate_game(gs: GameState, mcts: Mcts | None = None):
+    mcts = mcts or Mcts()
+    while not gs.game_ended:
+        turn = mcts.search(gs)
+        apply_turn(gs, turn).end_turn()
+        mcts.advance(turn)
+    return gs
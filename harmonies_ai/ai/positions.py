@@ -0,0 +1,144 @@
+import os
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+from tqdm import tqdm
+from harmonies_ai.ai.runner import ais, game_seed
+from harmonies_ai.encode import encode_state, feature_size
+from harmonies_ai.game_state import EndTurnAction, GameState
+
+
+def play_positions(args: tuple[str, int, int]):
+    """Play one game, then encode the position at the start of every turn.
+
+    The game is replayed from its actions, so the AI doesn't need to know about
+    the positions being recorded.
+    """
+    ai, run_seed, game = args
+    seed = game_seed(run_seed, game)
+    final = ais[ai](GameState(seed))
+
+    gs = GameState(seed)
+    positions = [encode_state(gs)]
+    for action in final.history:
+        gs.apply(action)
+        if isinstance(action, EndTurnAction) and not gs.game_ended:
+            positions.append(encode_state(gs))
+    return np.stack(positions), final.score.total
+
+
+def shard_paths(path: Path) -> Iterator[tuple[Path, Path]]:
+    """Positions and labels files of every shard written to a directory."""
+    for positions in sorted(path.glob("positions-*.npy")):
+        yield positions, positions.with_name(
+            positions.name.replace("positions", "labels")
+        )
+
+
+class PositionShards:
+    """Streams encoded positions and their labels into memory-mapped .npy shards.
+
+    Each shard is a memory map of `shard_size` rows, filled as positions arrive
+    and renamed into place once full, so memory use doesn't grow with the number
+    of positions. Shards already in the directory are kept and added to.
+    """
+
+    def __init__(self, path: Path, shard_size: int = 100000):
+        self.path = path
+        self.shard_size = shard_size
+        path.mkdir(parents=True, exist_ok=True)
+        self.shards = len(list(shard_paths(path)))
+        self._positions: np.memmap | None = None
+        self._labels: np.memmap | None = None
+        self._rows = 0
+
+    def _temp_paths(self):
+        return self.path / "positions.npy.tmp", self.path / "labels.npy.tmp"
+
+    def _final_paths(self):
+        name = f"{self.shards:05}.npy"
+        return self.path / f"positions-{name}", self.path / f"labels-{name}"
+
+    def _open(self):
+        positions_path, labels_path = self._temp_paths()
+        self._positions = np.lib.format.open_memmap(
+            positions_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(self.shard_size, feature_size),
+        )
+        self._labels = np.lib.format.open_memmap(
+            labels_path, mode="w+", dtype=np.float32, shape=(self.shard_size,)
+        )
+        self._rows = 0
+
+    def add(self, positions: np.ndarray, label: float):
+        """Add the positions of one game, all labelled with its final score."""
+        start = 0
+        while start < len(positions):
+            if self._positions is None:
+                self._open()
+            count = min(len(positions) - start, self.shard_size - self._rows)
+            self._positions[self._rows : self._rows + count] = positions[
+                start : start + count
+            ]
+            self._labels[self._rows : self._rows + count] = label
+            self._rows += count
+            start += count
+            if self._rows == self.shard_size:
+                self._finish()
+
+    def _finish(self):
+        self._positions.flush()
+        self._labels.flush()
+        self._positions = self._labels = None
+        for temp, final in zip(self._temp_paths(), self._final_paths()):
+            os.replace(temp, final)
+        self.shards += 1
+
+    def close(self):
+        """Write out a partly filled shard, trimmed to the rows added."""
+        if self._positions is None:
+            return
+        positions, labels, rows = self._positions, self._labels, self._rows
+        for final, data in zip(self._final_paths(), (positions, labels)):
+            if rows:
+                np.save(final, data[:rows])
+        self._positions = self._labels = None
+        for temp in self._temp_paths():
+            temp.unlink()
+        if rows:
+            self.shards += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _play_all(args: list[tuple[str, int, int]], workers: int):
+    if workers == 1:
+        yield from map(play_positions, args)
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(play_positions, args)
+
+
+def generate(
+    path: Path,
+    games: int,
+    ai: str = "greedy",
+    run_seed: int = 0,
+    workers: int = 1,
+    shard_size: int = 100000,
+):
+    """Play self-play games and stream their labelled positions to shards."""
+    if ai not in ais:
+        raise Exception(f"Unknown AI {ai}")
+    args = [(ai, run_seed, game) for game in range(games)]
+    results = _play_all(args, workers)
+    with PositionShards(path, shard_size) as shards:
+        for positions, total in tqdm(results, total=games, desc="Playing games"):
+            shards.add(positions, total)
@@ -1,14 +1,14 @@
-from random import choice
 from harmonies_ai.game_state import GameState
 
 
 def simulate_game(gs: GameState):
+    # Choices come from a fork so the game's own draws only depend on its actions,
+    # and replaying the actions from the seed gives the same game
+    rng = gs.fork_rng()
     while not gs.game_ended:
-        tokens = choice(gs.display_tokens)
+        tokens = rng.choice(gs.display_tokens)
         for token in tokens:
-            pos = choice(
-                [pos for pos, stack in enumerate(gs.board) if token in stack.placements]
-            )
+            pos = rng.choice(gs.legal_token_positions(token))
             gs.place_token(token, pos)
         gs.end_turn()
     return gs
@@ -1,19 +1,365 @@
-from harmonies_ai.game_state import GameState
-from rich.console import Console
-from harmonies_ai.ai.greedy import simulate_game
-import pandas as pd
+import argparse
+import cProfile
+import heapq
+import json
+import marshal
+import os
+from multiprocessing import Pool
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable, Iterable, NamedTuple
 from tqdm import tqdm
+from harmonies_ai.ai import beam, greedy, lockstep, mcts
+from harmonies_ai import instrument
+from harmonies_ai.aggregate import RunningStats, ShardedResults, parquet_available
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.game_state import GameState, Score
+from harmonies_ai.record import GameRecord, RecordWriter, encode_actions
 
-console = Console()
 
+if TYPE_CHECKING:
+    from rich.console import Console
 
-# %%
-def results_to_df(results: list[GameState]):
-    return pd.DataFrame({"score": gs.score.total} for gs in results)
 
+def _simulate_value(gs: GameState):
+    # torch is slow to import, so only runs using the value network load it
+    from harmonies_ai.ai import value
 
-# %%
-results = []
-for _ in tqdm(range(100), desc="Playing games"):
-    results.append(simulate_game(GameState()))
-df = results_to_df(results)
+    return value.simulate_game(gs)
+
+
+ais: dict[str, Callable[[GameState], GameState]] = {
+    "beam": beam.simulate_game,
+    "greedy": greedy.simulate_game,
+    "mcts": mcts.simulate_game,
+    "random": random_ai.simulate_game,
+    "value": _simulate_value,
+}
+
+
+class GameResult(NamedTuple):
+    game: int
+    seed: int
+    trees: int
+    mountains: int
+    fields: int
+    buildings: int
+    water: int
+    cards: int
+    total: int
+    turns: int
+    seconds: float
+    stats: dict[str, Any] | None = None
+    turn_log: list[dict[str, Any]] | None = None
+    profile: dict | None = None
+    actions: bytes | None = None
+    worker: int = 0
+
+
+class RunOptions(NamedTuple):
+    stats: bool = False
+    # Log each turn's counters as well as its time
+    turn_log: bool = False
+    # Log only each turn's time, leaving the hot path counters off
+    turn_times: bool = False
+    profile: bool = False
+    record: bool = False
+
+
+result_components = ("trees", "mountains", "fields", "buildings", "water", "cards")
+summary_columns = (*result_components, "total", "turns", "seconds")
+shard_columns = ("game", "seed", *summary_columns)
+# Lockstep games aren't timed one by one
+lockstep_columns = (*result_components, "total", "turns")
+
+
+def game_seed(run_seed: int, game: int):
+    # Run seeds are 32 bits, so game seeds fit the 64 bits game records keep
+    return run_seed << 32 | game
+
+
+def seed_argument(value: str):
+    seed = int(value)
+    if not 0 <= seed < 1 << 32:
+        raise argparse.ArgumentTypeError(f"seed {seed} is not between 0 and 2**32 - 1")
+    return seed
+
+
+def play_game(ai: str, run_seed: int, game: int, options=RunOptions()):
+    seed = game_seed(run_seed, game)
+    log_turns = options.turn_log or options.turn_times
+    instrument.enabled = options.stats or options.turn_log
+    instrument.log_turns = log_turns
+    instrument.reset()
+    profiler = cProfile.Profile() if options.profile else None
+
+    start = perf_counter()
+    if profiler:
+        profiler.enable()
+    gs = ais[ai](GameState(seed))
+    if profiler:
+        profiler.disable()
+        profiler.create_stats()
+    seconds = perf_counter() - start
+
+    instrument.enabled = instrument.log_turns = False
+    score: Score = gs.score
+    return GameResult(
+        game=game,
+        seed=seed,
+        trees=score.trees,
+        mountains=score.mountains,
+        fields=score.fields,
+        buildings=score.buildings,
+        water=score.water,
+        cards=score.cards_subtotal,
+        total=score.total,
+        turns=gs.turn,
+        seconds=seconds,
+        stats=instrument.snapshot() if options.stats else None,
+        turn_log=list(instrument.turn_log) if log_turns else None,
+        profile=profiler.stats if profiler else None,
+        actions=encode_actions(gs.history) if options.record else None,
+        worker=os.getpid(),
+    )
+
+
+def play_chunk(args: tuple[str, int, range, RunOptions]):
+    ai, run_seed, games, options = args
+    return [play_game(ai, run_seed, game, options) for game in games]
+
+
+def run_games(
+    ai: str,
+    games: Iterable[int],
+    run_seed: int,
+    workers: int,
+    chunk_size: int,
+    options=RunOptions(),
+):
+    """Play games across a process pool, yielding results as chunks complete."""
+    games = list(games)
+    chunks = [
+        (ai, run_seed, games[i : i + chunk_size], options)
+        for i in range(0, len(games), chunk_size)
+    ]
+    if workers == 1:
+        for chunk in chunks:
+            yield from play_chunk(chunk)
+        return
+    with Pool(workers) as pool:
+        for results in pool.imap_unordered(play_chunk, chunks):
+            yield from results
+
+
+def run_lockstep(
+    summary: dict[str, RunningStats], games: int, run_seed: int, batch_size: int
+):
+    """Play random games in lockstep batches, adding each batch to the summary."""
+    starts = range(0, games, batch_size)
+    for batch, start in enumerate(tqdm(starts, desc="Playing batches")):
+        scores, turns = lockstep.simulate_games(
+            min(batch_size, games - start), seed=(run_seed, batch)
+        )
+        columns = {name: scores[:, i] for i, name in enumerate(result_components)}
+        columns["total"] = scores.sum(axis=1)
+        columns["turns"] = turns
+        for name, values in columns.items():
+            summary[name].add_array(values)
+
+
+def print_summary(
+    console: "Console", summary: dict[str, RunningStats], played: int, wall: float
+):
+    from rich.table import Table
+
+    games = summary["total"].count
+    table = Table(
+        title=f"{games} games, {played} played in {wall:.1f}s"
+        f" ({played / wall:.1f} games/s)"
+    )
+    table.add_column("component")
+    for column in ("mean", "std", "min", "max"):
+        table.add_column(column, justify="right")
+    for name, stats in summary.items():
+        table.add_row(
+            name,
+            f"{stats.mean:.2f}",
+            f"{stats.std:.2f}",
+            f"{stats.min:.3g}",
+            f"{stats.max:.3g}",
+        )
+    console.print(table)
+
+
+def print_stats(console: "Console", stats: dict[str, Any], games: int, turns: float):
+    from rich.table import Table
+
+    table = Table(title="Instrumentation")
+    table.add_column("counter")
+    table.add_column("per game", justify="right")
+    table.add_column("per turn", justify="right")
+    table.add_row("turns", f"{turns / games:.1f}", "1.0")
+    for name, value in sorted(stats["counters"].items()):
+        table.add_row(name, f"{value / games:.1f}", f"{value / turns:.1f}")
+    for name, seconds in sorted(stats["timers"].items()):
+        table.add_row(f"{name} (s)", f"{seconds / games:.4f}", f"{seconds / turns:.4f}")
+    console.print(table)
+
+
+def add_stats(totals: dict[str, Any], stats: dict[str, Any]):
+    for kind in ("counters", "timers"):
+        for name, value in stats[kind].items():
+            totals[kind][name] = totals[kind].get(name, 0) + value
+
+
+def save_profiles(
+    console: "Console", slowest: list[tuple[float, int, dict]], path: Path
+):
+    """Write each profile as a .prof file readable by pstats or snakeviz."""
+    path.mkdir(parents=True, exist_ok=True)
+    for seconds, game, stats in sorted(slowest, reverse=True):
+        profile_path = path / f"game-{game}.prof"
+        profile_path.write_bytes(marshal.dumps(stats))
+        console.print(f"Game {game} took {seconds:.2f}s, profile in {profile_path}")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="harmonies-sim", description="Play Harmonies self-play games"
+    )
+    parser.add_argument("--ai", choices=sorted(ais), default="greedy")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=seed_argument, default=0)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument(
+        "--stats", action="store_true", help="count and time the engine hot paths"
+    )
+    parser.add_argument(
+        "--turn-log", type=Path, help="write per-turn instrumentation as JSON lines"
+    )
+    parser.add_argument(
+        "--profile", type=int, default=0, help="profile and save the N slowest games"
+    )
+    parser.add_argument("--profile-dir", type=Path, default=Path("profiles"))
+    parser.add_argument(
+        "--record", type=Path, help="append every game to a game record file"
+    )
+    parser.add_argument(
+        "--output", type=Path, help="write results in shards, resuming if present"
+    )
+    parser.add_argument("--shard-size", type=int, default=10000)
+    parser.add_argument("--shard-format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument(
+        "--dashboard", action="store_true", help="show a live dashboard of the run"
+    )
+    parser.add_argument(
+        "--lockstep",
+        action="store_true",
+        help="play random games together in batches of NumPy arrays",
+    )
+    parser.add_argument("--batch-size", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.lockstep:
+        if args.ai != "random":
+            parser.error("--lockstep only plays the random AI, use --ai random")
+        per_game = ("stats", "turn_log", "profile", "record", "output", "dashboard")
+        if any(getattr(args, option) for option in per_game):
+            parser.error("--lockstep games have no per-game results or output")
+        from rich.console import Console
+
+        summary = {column: RunningStats() for column in lockstep_columns}
+        start = perf_counter()
+        run_lockstep(summary, args.games, args.seed, args.batch_size)
+        print_summary(Console(), summary, args.games, perf_counter() - start)
+        return
+
+    # The dashboard shows turn times and replays sample games from their actions
+    options = RunOptions(
+        stats=args.stats,
+        turn_log=args.turn_log is not None,
+        # The dashboard only shows turn times, so it leaves the counters off
+        turn_times=args.dashboard,
+        profile=args.profile > 0,
+        record=args.record is not None or args.dashboard,
+    )
+    output = None
+    if args.shard_format == "parquet" and not parquet_available():
+        parser.error("--shard-format parquet needs pyarrow or fastparquet installed")
+    if args.output:
+        output = ShardedResults(
+            args.output, summary_columns, args.shard_size, args.shard_format
+        )
+        summary = output.stats
+    else:
+        summary = {column: RunningStats() for column in summary_columns}
+    games = [
+        game for game in range(args.games) if not (output and output.is_completed(game))
+    ]
+
+    instrumentation = {"counters": {}, "timers": {}}
+    turns = 0
+    slowest: list[tuple[float, int, dict]] = []
+    turn_log = args.turn_log.open("w") if args.turn_log else None
+    records = RecordWriter(args.record) if args.record else None
+
+    start = perf_counter()
+    results = run_games(
+        args.ai, games, args.seed, args.workers, args.chunk_size, options
+    )
+    dashboard = None
+    if args.dashboard:
+        from harmonies_ai.ai.dashboard import Dashboard
+
+        dashboard = Dashboard(summary, len(games))
+        dashboard.__enter__()
+    else:
+        results = tqdm(results, total=len(games), desc="Playing games")
+    try:
+        for result in results:
+            if output:
+                output.add({name: getattr(result, name) for name in shard_columns})
+            else:
+                for name, stats in summary.items():
+                    stats.add(getattr(result, name))
+            turns += result.turns
+            if result.stats:
+                add_stats(instrumentation, result.stats)
+            if turn_log:
+                for record in result.turn_log:
+                    turn_log.write(json.dumps({"game": result.game, **record}) + "\n")
+            if records:
+                records.append(GameRecord(result.seed, result.actions))
+            if result.profile is not None:
+                entry = (result.seconds, result.game, result.profile)
+                if len(slowest) < args.profile:
+                    heapq.heappush(slowest, entry)
+                else:
+                    heapq.heappushpop(slowest, entry)
+            if dashboard:
+                dashboard.update(result)
+    finally:
+        if dashboard:
+            dashboard.__exit__(None, None, None)
+        if output:
+            output.flush()
+        if turn_log:
+            turn_log.close()
+        if records:
+            records.close()
+
+    # Pool workers import this module too, so rich is only imported for display
+    from rich.console import Console
+
+    console = Console()
+    print_summary(console, summary, len(games), perf_counter() - start)
+    if args.stats and games:
+        print_stats(console, instrumentation, len(games), turns)
+    if slowest:
+        save_profiles(console, slowest, args.profile_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from enum import Enum
+from typing import NamedTuple
+
+
+class ReplacementPolicy(Enum):
+    ALWAYS = "always"
+    DEPTH = "depth"
+
+
+class TableEntry(NamedTuple):
+    key: int
+    depth: int
+    value: float
+
+
+class TranspositionTable:
+    """Fixed size table of evaluations indexed by the low bits of a Zobrist key."""
+
+    slots: list[TableEntry | None]
+    policy: ReplacementPolicy
+
+    hits: int
+    misses: int
+    replacements: int
+
+    def __init__(
+        self, size_bits: int = 16, policy: ReplacementPolicy = ReplacementPolicy.DEPTH
+    ):
+        self.slots = [None] * (1 << size_bits)
+        self._index_mask = (1 << size_bits) - 1
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.replacements = 0
+
+    def lookup(self, key: int, depth: int = 0):
+        """Return the stored value if it was searched at least as deep, else None."""
+        entry = self.slots[key & self._index_mask]
+        if entry is not None and entry.key == key and entry.depth >= depth:
+            self.hits += 1
+            return entry.value
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, value: float):
+        index = key & self._index_mask
+        entry = self.slots[index]
+        if entry is not None:
+            # A deeper result is kept, whether or not it is for the same key
+            if self.policy == ReplacementPolicy.DEPTH and entry.depth > depth:
+                return
+            if entry.key != key:
+                self.replacements += 1
+        self.slots[index] = TableEntry(key, depth, value)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
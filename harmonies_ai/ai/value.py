@@ -0,0 +1,239 @@
+import argparse
+from bisect import bisect_right
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, Dataset, random_split
+from tqdm import tqdm
+from harmonies_ai.aggregate import RunningStats
+from harmonies_ai.ai.greedy import apply_turn, next_turn_boards
+from harmonies_ai.ai.positions import generate, shard_paths
+from harmonies_ai.ai.runner import ais, seed_argument
+from harmonies_ai.encode import encode_next_turns, feature_size
+from harmonies_ai.game_state import GameState
+
+
+default_model = Path("models") / "value.pt"
+
+
+class PositionDataset(Dataset):
+    """Labelled positions read from .npy shards as they are needed.
+
+    Shards are opened as read-only memory maps, separately in each DataLoader
+    worker, so only the rows in use are ever paged in.
+    """
+
+    def __init__(self, path: Path):
+        self.shards = list(shard_paths(path))
+        sizes = [len(np.load(labels, mmap_mode="r")) for _, labels in self.shards]
+        self._starts = np.cumsum([0, *sizes]).tolist()
+        self._open: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def _shard(self, shard: int):
+        if shard not in self._open:
+            positions, labels = self.shards[shard]
+            self._open[shard] = (
+                np.load(positions, mmap_mode="r"),
+                np.load(labels, mmap_mode="r"),
+            )
+        return self._open[shard]
+
+    def __getitem__(self, index: int):
+        shard = bisect_right(self._starts, index) - 1
+        positions, labels = self._shard(shard)
+        row = index - self._starts[shard]
+        return torch.from_numpy(np.array(positions[row])), torch.tensor(labels[row])
+
+    def __getstate__(self):
+        # Memory maps would be pickled as copies of their data, so workers
+        # open the shards again themselves
+        return {**self.__dict__, "_open": {}}
+
+    def label_stats(self):
+        stats = RunningStats()
+        for shard in range(len(self.shards)):
+            stats.add_array(self._shard(shard)[1])
+        return stats
+
+
+class ValueNet(nn.Module):
+    """Small MLP predicting the final score of a game from an encoded position.
+
+    It trains on labels normalised by their mean and standard deviation, which
+    are kept with its weights so predictions come back as scores.
+    """
+
+    def __init__(self, hidden: tuple[int, ...] = (256, 64)):
+        super().__init__()
+        self.hidden = hidden
+        layers: list[nn.Module] = []
+        size = feature_size
+        for width in hidden:
+            layers += [nn.Linear(size, width), nn.ReLU()]
+            size = width
+        layers.append(nn.Linear(size, 1))
+        self.layers = nn.Sequential(*layers)
+        self.register_buffer("label_mean", torch.tensor(0.0))
+        self.register_buffer("label_std", torch.tensor(1.0))
+
+    def forward(self, features: torch.Tensor):
+        """Normalised score of each row of features."""
+        return self.layers(features).squeeze(-1)
+
+    def normalise(self, labels: torch.Tensor):
+        return (labels - self.label_mean) / self.label_std
+
+    @torch.no_grad()
+    def predict(self, features: np.ndarray):
+        """Expected final score of each row of features."""
+        normalised = self(torch.from_numpy(features))
+        return (normalised * self.label_std + self.label_mean).numpy()
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save({"hidden": self.hidden, "state_dict": self.state_dict()}, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        checkpoint = torch.load(path, weights_only=True)
+        model = cls(tuple(checkpoint["hidden"]))
+        model.load_state_dict(checkpoint["state_dict"])
+        return model.eval()
+
+
+def _mean_loss(model: ValueNet, loader: DataLoader, optimizer=None):
+    total, count = 0.0, 0
+    for features, labels in loader:
+        loss = nn.functional.mse_loss(model(features), model.normalise(labels))
+        if optimizer is not None:
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        total += loss.item() * len(labels)
+        count += len(labels)
+    return total / max(count, 1)
+
+
+def train(
+    path: Path,
+    output: Path = default_model,
+    epochs: int = 10,
+    batch_size: int = 256,
+    learning_rate: float = 1e-3,
+    hidden: tuple[int, ...] = (256, 64),
+    validation: float = 0.1,
+    workers: int = 0,
+    seed: int = 0,
+):
+    """Train a value network on the shards in a directory, on the CPU.
+
+    Returns the trained network and the validation loss after each epoch, in
+    units of the label variance.
+    """
+    torch.manual_seed(seed)
+    dataset = PositionDataset(path)
+    if not len(dataset):
+        raise Exception(f"No positions in {path}")
+    held_out = int(len(dataset) * validation)
+    train_set, validation_set = random_split(
+        dataset, [len(dataset) - held_out, held_out]
+    )
+    train_loader = DataLoader(train_set, batch_size, shuffle=True, num_workers=workers)
+    validation_loader = DataLoader(validation_set, batch_size, num_workers=workers)
+
+    model = ValueNet(hidden)
+    stats = dataset.label_stats()
+    model.label_mean.fill_(stats.mean)
+    model.label_std.fill_(stats.std or 1.0)
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+
+    losses = []
+    progress = tqdm(range(epochs), desc="Training")
+    for _ in progress:
+        model.train()
+        train_loss = _mean_loss(model, train_loader, optimizer)
+        model.eval()
+        with torch.no_grad():
+            losses.append(_mean_loss(model, validation_loader))
+        progress.set_postfix(train_loss=train_loss, validation_loss=losses[-1])
+    model.save(output)
+    return model, losses
+
+
+@lru_cache(maxsize=4)
+def load_model(path: Path = default_model):
+    return ValueNet.load(path)
+
+
+def evaluate_next_turns(gs: GameState, model: ValueNet):
+    """Return every distinct next turn and the final score the network expects.
+
+    Gives the same turns as greedy.score_next_turns, so AIs can evaluate turns
+    with either.
+    """
+    turns, boards = next_turn_boards(gs)
+    return turns, model.predict(encode_next_turns(gs, boards))
+
+
+def simulate_game(gs: GameState, model: ValueNet | None = None):
+    model = model or load_model()
+    while not gs.game_ended:
+        turns, values = evaluate_next_turns(gs, model)
+        apply_turn(gs, turns[values.argmax()]).end_turn()
+    return gs
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="harmonies-value", description="Train a value network from self-play"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser(
+        "generate", help="play games and write labelled positions to shards"
+    )
+    generate_parser.add_argument("--output", type=Path, default=Path("positions"))
+    generate_parser.add_argument("--games", type=int, default=1000)
+    # The value AI would need a trained model to play, so it isn't offered
+    generate_parser.add_argument(
+        "--ai", choices=sorted(set(ais) - {"value"}), default="greedy"
+    )
+    generate_parser.add_argument("--seed", type=seed_argument, default=0)
+    generate_parser.add_argument("--workers", type=int, default=1)
+    generate_parser.add_argument("--shard-size", type=int, default=100000)
+
+    train_parser = commands.add_parser("train", help="train on labelled positions")
+    train_parser.add_argument("--data", type=Path, default=Path("positions"))
+    train_parser.add_argument("--model", type=Path, default=default_model)
+    train_parser.add_argument("--epochs", type=int, default=10)
+    train_parser.add_argument("--batch-size", type=int, default=256)
+    train_parser.add_argument("--learning-rate", type=float, default=1e-3)
+    train_parser.add_argument("--hidden", type=int, nargs="+", default=[256, 64])
+    train_parser.add_argument("--workers", type=int, default=0)
+    train_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        generate(
+            args.output, args.games, args.ai, args.seed, args.workers, args.shard_size
+        )
+    else:
+        train(
+            args.data,
+            args.model,
+            args.epochs,
+            args.batch_size,
+            args.learning_rate,
+            tuple(args.hidden),
+            workers=args.workers,
+            seed=args.seed,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import numpy as np
+from harmonies_ai import instrument
+from harmonies_ai.bitboard import mountain_values, neighbours, top_tokens, tree_values
+from harmonies_ai.bitboard import water_score
+from harmonies_ai.grid import grid_adjacent, grid_mask, grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+# Columns of the array returned by score_batch, in Score field order
+score_columns = ("trees", "mountains", "fields", "buildings", "water", "cards")
+
+_tree_array = np.array(tree_values)
+_mountain_array = np.array(mountain_values)
+_water_array = np.array([water_score(length) for length in range(grid_size + 1)])
+
+# Top token index of each stack, or -1 for an empty stack
+_top_array = np.array(
+    [-1 if token is None else list(Token).index(token) for token in top_tokens]
+)
+
+# Adjacent positions padded with an index one past the end of the grid
+_adjacent_padded = np.array(
+    [adjacent + (grid_size,) * (6 - len(adjacent)) for adjacent in grid_adjacent]
+)
+
+# Maps each byte of a position bitmask to the bitmask of all adjacent positions
+_adjacent_byte_masks = np.array(
+    [
+        [neighbours(value << shift & grid_mask) for value in range(256)]
+        for shift in (0, 8, 16)
+    ],
+    dtype=np.int64,
+)
+
+
+def _gather_adjacent(cells: np.ndarray, pad_value):
+    padded = np.concatenate(
+        [cells, np.full((len(cells), 1), pad_value, dtype=cells.dtype)], axis=1
+    )
+    return padded[:, _adjacent_padded]
+
+
+def _score_fields(fields: np.ndarray):
+    # Propagate the smallest position in each group until every label is stable
+    positions = np.arange(grid_size)
+    labels = np.where(fields, positions, grid_size)
+    while True:
+        adjacent = _gather_adjacent(labels, grid_size).min(axis=2)
+        new_labels = np.where(fields, np.minimum(labels, adjacent), grid_size)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    # Every member of a group of two or more has a field neighbour, including the
+    # group's lowest position, so count those roots
+    has_neighbour = _gather_adjacent(fields, False).any(axis=2)
+    return 5 * (fields & (labels == positions) & has_neighbour).sum(axis=1)
+
+
+def _neighbours(masks: np.ndarray):
+    return (
+        _adjacent_byte_masks[0][masks & 0xFF]
+        | _adjacent_byte_masks[1][masks >> 8 & 0xFF]
+        | _adjacent_byte_masks[2][masks >> 16 & 0xFF]
+    )
+
+
+def _score_water(water: np.ndarray):
+    water_masks = (water.astype(np.int64) << np.arange(grid_size)).sum(axis=1)
+    longest_river = water.any(axis=1).astype(np.int64)
+
+    # Grow one river from every water position at once, for boards still growing
+    active = np.flatnonzero(water.sum(axis=1) >= 2)
+    reach = np.where(water[active], 1 << np.arange(grid_size), 0)
+    length = 1
+    while len(active):
+        length += 1
+        new_reach = (reach | _neighbours(reach)) & water_masks[active, None]
+        grew = (new_reach != reach).any(axis=1)
+        active, reach = active[grew], new_reach[grew]
+        longest_river[active] = length
+
+    return _water_array[longest_river]
+
+
+def score_batch(boards: np.ndarray):
+    """Score an (N, 23) array of stack indices into an (N, 6) array of Score columns.
+
+    The cards column is always zero, as card rewards don't depend on the board.
+    """
+    boards = np.asarray(boards)
+    if instrument.enabled:
+        instrument.count("batch_scores", len(boards))
+        with instrument.timed("score_batch"):
+            return _score_batch(boards)
+    return _score_batch(boards)
+
+
+def _score_trees(boards: np.ndarray, adjacent_tops: np.ndarray):
+    return _tree_array[boards].sum(axis=1)
+
+
+def _score_mountains(boards: np.ndarray, adjacent_tops: np.ndarray):
+    next_to_gray = (adjacent_tops == list(Token).index(Token.GRY)).any(axis=2)
+    return (_mountain_array[boards] * next_to_gray).sum(axis=1)
+
+
+def _score_fields_column(boards: np.ndarray, adjacent_tops: np.ndarray):
+    return _score_fields(boards == Stack.FIELD1.index)
+
+
+def _score_buildings(boards: np.ndarray, adjacent_tops: np.ndarray):
+    adjacent_colours = sum(
+        (adjacent_tops == token).any(axis=2) for token in range(len(Token))
+    )
+    well_placed = (boards == Stack.BUILD2.index) & (adjacent_colours >= 3)
+    return 5 * well_placed.sum(axis=1)
+
+
+def _score_water_column(boards: np.ndarray, adjacent_tops: np.ndarray):
+    return _score_water(boards == Stack.WATER1.index)
+
+
+_column_scorers = (
+    ("trees", _score_trees),
+    ("mountains", _score_mountains),
+    ("fields", _score_fields_column),
+    ("buildings", _score_buildings),
+    ("water", _score_water_column),
+)
+
+
+def _score_batch(boards: np.ndarray):
+    adjacent_tops = _gather_adjacent(_top_array[boards], -1)
+    columns = []
+    for name, scorer in _column_scorers:
+        if instrument.enabled:
+            # Timed under the same names as GameState.score, so the stats table
+            # shows the cost of each component whichever way boards are scored
+            with instrument.timed(f"score_{name}"):
+                columns.append(scorer(boards, adjacent_tops))
+        else:
+            columns.append(scorer(boards, adjacent_tops))
+    columns.append(np.zeros(len(boards), dtype=np.int64))
+    return np.stack(columns, axis=1)
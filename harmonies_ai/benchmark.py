@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+from random import Random
+from timeit import Timer
+from typing import Callable
+from rich.console import Console
+from rich.table import Table
+from harmonies_ai import bitboard
+from harmonies_ai.ai import greedy, lockstep
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.compact import CompactState
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+default_baseline = Path(__file__).parent.parent / "benchmarks" / "baseline.json"
+
+# Number of random turns played to reach each benchmark position
+_position_turns = {"sparse": 2, "mid": 6, "full": None}
+
+
+def seeded_position(seed: int, turns: int | None):
+    """Play random turns from a seeded game, or the whole game if turns is None."""
+    gs = GameState(seed)
+    rng = Random(seed)
+    while not gs.game_ended and (turns is None or gs.turn < turns):
+        for token in rng.choice(gs.display_tokens):
+            pos = rng.choice(gs.legal_token_positions(token))
+            gs.place_token(token, pos)
+        gs.end_turn()
+    return gs
+
+
+def _uncached(function: Callable[[], object]):
+    # Group and river results are cached by mask, and timing the same position
+    # over and over would only time cache hits
+    def timed():
+        bitboard.cache_clear()
+        return function()
+
+    return timed
+
+
+def _bench_score(turns: int | None):
+    def setup():
+        gs = seeded_position(0, turns)
+        return _uncached(lambda: gs.score)
+
+    return setup
+
+
+def _bench_find_groups():
+    gs = seeded_position(0, None)
+    return _uncached(
+        lambda: [gs.find_groups(stack) for stack in Stack if stack != Stack.EMPTY0]
+    )
+
+
+def _bench_find_longest_river():
+    gs = seeded_position(0, None)
+    return _uncached(gs.find_longest_river)
+
+
+def _bench_copy():
+    gs = seeded_position(0, _position_turns["mid"])
+    return gs.copy
+
+
+def _bench_compact_state():
+    gs = seeded_position(0, _position_turns["mid"])
+    return lambda: CompactState.from_state(gs)
+
+
+def _bench_get_next_states():
+    gs = seeded_position(0, _position_turns["mid"])
+    return lambda: sum(1 for _ in greedy.get_next_states(gs))
+
+
+def _bench_score_next_turns():
+    gs = seeded_position(0, _position_turns["mid"])
+    return lambda: greedy.score_next_turns(gs)
+
+
+def _bench_legal_token_positions():
+    gs = seeded_position(0, _position_turns["mid"])
+    return lambda: [gs.legal_token_positions(token) for token in Token]
+
+
+def _bench_could_place_cube():
+    gs = seeded_position(0, None)
+    return lambda: [
+        gs.could_place_cube(card, pos)
+        for card in AnimalCard
+        for pos in range(grid_size)
+    ]
+
+
+def _bench_render():
+    gs = seeded_position(0, None)
+    output = open(os.devnull, "w")
+    console = Console(width=140, color_system="truecolor", file=output)
+    return lambda: console.print(gs)
+
+
+def _bench_simulate(simulate_game: Callable[[GameState], GameState]):
+    def setup():
+        return lambda: simulate_game(GameState(0))
+
+    return setup
+
+
+def _bench_simulate_lockstep():
+    # A batch of 1000 games, to compare with 1000 times simulate_random
+    return lambda: lockstep.simulate_games(1000, seed=0)
+
+
+# Each benchmark builds its seeded position and returns the function to time
+benchmarks: dict[str, Callable[[], Callable[[], object]]] = {
+    **{f"score_{name}": _bench_score(turns) for name, turns in _position_turns.items()},
+    "find_groups": _bench_find_groups,
+    "find_longest_river": _bench_find_longest_river,
+    "copy": _bench_copy,
+    "compact_state": _bench_compact_state,
+    "get_next_states": _bench_get_next_states,
+    "score_next_turns": _bench_score_next_turns,
+    "legal_token_positions": _bench_legal_token_positions,
+    "could_place_cube": _bench_could_place_cube,
+    "render": _bench_render,
+    "simulate_random": _bench_simulate(random_ai.simulate_game),
+    "simulate_greedy": _bench_simulate(greedy.simulate_game),
+    "simulate_lockstep": _bench_simulate_lockstep,
+}
+
+
+# Modules timed by importing them in a fresh interpreter
+import_benchmarks = {
+    "import_game_state": "harmonies_ai.game_state",
+    "import_greedy": "harmonies_ai.ai.greedy",
+    "import_runner": "harmonies_ai.ai.runner",
+}
+
+
+def import_seconds(module: str):
+    """Time to import a module and everything it imports, from -X importtime."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time: <self us> | <cumulative us> | <module>"
+    for line in process.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1e6
+    raise Exception(f"No import time for {module}")
+
+
+def run_benchmark(name: str, repeat: int = 5, min_seconds: float = 0.2):
+    """Best time per call in seconds, out of several repeats."""
+    if name in import_benchmarks:
+        return min(import_seconds(import_benchmarks[name]) for _ in range(repeat))
+
+    timer = Timer(benchmarks[name]())
+    number = 1
+    while timer.timeit(number) < min_seconds and number < 1 << 20:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def format_seconds(seconds: float):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float):
+    """Names of benchmarks more than threshold slower than the baseline."""
+    return [
+        name
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="harmonies-bench", description="Time the engine's hot paths"
+    )
+    parser.add_argument("names", nargs="*", help="benchmarks to run, default all")
+    parser.add_argument("--baseline", type=Path, default=default_baseline)
+    parser.add_argument("--save", action="store_true", help="overwrite the baseline")
+    # Best-of-three suites on a shared machine were seen to differ by up to 69%
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=3,
+        help="passes over the benchmarks, keeping each one's best time",
+    )
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(benchmarks) - set(import_benchmarks)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())["results"]
+
+    console = Console()
+    table = Table(title="Benchmarks")
+    table.add_column("benchmark")
+    table.add_column("time", justify="right")
+    table.add_column("baseline", justify="right")
+    table.add_column("change", justify="right")
+
+    # Passes are interleaved rather than repeating each benchmark back to back,
+    # so a slow spell on the machine doesn't land on one benchmark's every try.
+    # Saving and comparing measure the same way, so they can be compared.
+    names = args.names or [*benchmarks, *import_benchmarks]
+    results: dict[str, float] = {}
+    for _ in range(args.runs):
+        for name in names:
+            seconds = run_benchmark(name, args.repeat)
+            results[name] = min(results.get(name, seconds), seconds)
+
+    for name, seconds in results.items():
+        row = [name, format_seconds(seconds), "", ""]
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            style = "red" if change > args.threshold else "green"
+            row[2:] = [format_seconds(baseline[name]), f"[{style}]{change:+.0%}"]
+        table.add_row(*row)
+    console.print(table)
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        saved = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "runs": args.runs,
+            "results": baseline | results,
+        }
+        args.baseline.write_text(json.dumps(saved, indent=2) + "\n")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        console.print(f"[red]Regressed by over {args.threshold:.0%}:", *regressions)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+from functools import lru_cache
+from random import Random
+from typing import Iterator
+from harmonies_ai.grid import GridPosition, grid_adjacent_masks, grid_mask, grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+_tree_scoring = ((Stack.TREES1, 1), (Stack.TREES2, 3), (Stack.TREES3, 7))
+_mountain_scoring = ((Stack.MOUNT1, 1), (Stack.MOUNT2, 3), (Stack.MOUNT3, 7))
+_water_scoring = (0, 0, 2, 5, 8, 11, 15)
+
+# Tree and mountain points indexed by stack index
+tree_values = [dict(_tree_scoring).get(stack, 0) for stack in Stack]
+mountain_values = [dict(_mountain_scoring).get(stack, 0) for stack in Stack]
+
+# Top token of each stack indexed by stack index
+top_tokens = [stack.components[-1] if stack.components else None for stack in Stack]
+
+# Zobrist keys for each stack at each position (zero for empty) and for cubes
+_zobrist_rng = Random(0x4A524D)
+zobrist_stacks = tuple(
+    tuple(
+        0 if stack == Stack.EMPTY0 else _zobrist_rng.getrandbits(64) for stack in Stack
+    )
+    for _ in range(grid_size)
+)
+zobrist_cubes = tuple(_zobrist_rng.getrandbits(64) for _ in range(grid_size))
+
+# Tokens whose placement mask changes when a cell's stack changes from one stack
+# to another, by old and new stack index
+_placement_changes = tuple(
+    tuple(
+        tuple(
+            token.index
+            for token in Token
+            if (token in old.placements) != (token in new.placements)
+        )
+        for new in Stack
+    )
+    for old in Stack
+)
+
+# Maps each token to the indices of all stacks with that token on top
+_stacks_by_top = {
+    token: tuple(
+        stack.index
+        for stack in Stack
+        if stack.components and stack.components[-1] == token
+    )
+    for token in Token
+}
+
+
+def iter_bits(mask: int) -> Iterator[GridPosition]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def neighbours(mask: int):
+    result = 0
+    while mask:
+        low = mask & -mask
+        result |= grid_adjacent_masks[low.bit_length() - 1]
+        mask ^= low
+    return result
+
+
+# Same shapes keep coming up across candidate boards, so group and river results
+# are cached by position mask
+_cache_size = 1 << 14
+
+
+@lru_cache(maxsize=_cache_size)
+def find_group_masks(mask: int) -> tuple[int, ...]:
+    groups: list[int] = []
+
+    while mask:
+        group = frontier = mask & -mask
+        while frontier:
+            frontier = neighbours(frontier) & mask & ~group
+            group |= frontier
+        groups.append(group)
+        mask &= ~group
+
+    return tuple(groups)
+
+
+def river_length(group: int):
+    longest_river = 0
+
+    for start in iter_bits(group):
+        length = 0
+        explored = 0
+        frontier = 1 << start
+
+        while frontier:
+            length += 1
+            explored |= frontier
+            frontier = neighbours(frontier) & group & ~explored
+
+        longest_river = max(longest_river, length)
+
+    return longest_river
+
+
+@lru_cache(maxsize=_cache_size)
+def longest_river(mask: int):
+    return max((river_length(group) for group in find_group_masks(mask)), default=0)
+
+
+def cache_info():
+    return {
+        "groups": find_group_masks.cache_info(),
+        "rivers": longest_river.cache_info(),
+    }
+
+
+def cache_clear():
+    find_group_masks.cache_clear()
+    longest_river.cache_clear()
+
+
+def water_score(longest_river: int):
+    if longest_river < len(_water_scoring):
+        return _water_scoring[longest_river]
+    return _water_scoring[-1] + 4 * (longest_river - len(_water_scoring) + 1)
+
+
+class StackGroups:
+    """Connected groups of the positions holding one stack, as a disjoint set.
+
+    A position joining is unioned with the groups of its neighbours. A position
+    leaving can split its group, so only that group is rebuilt from its mask.
+    """
+
+    # Parent of each position in the set, or -1 for positions not in it
+    parent: list[int]
+    # Mask of each group by its root position
+    masks: dict[GridPosition, int]
+    # Mask of every position in the set
+    members: int
+    # Number of groups of two or more positions
+    large_groups: int
+
+    def __init__(self):
+        self.parent = [-1] * grid_size
+        self.masks = {}
+        self.members = 0
+        self.large_groups = 0
+
+    def __deepcopy__(self, memo):
+        groups = StackGroups.__new__(StackGroups)
+        groups.parent = self.parent.copy()
+        groups.masks = self.masks.copy()
+        groups.members = self.members
+        groups.large_groups = self.large_groups
+        return groups
+
+    def find(self, pos: GridPosition):
+        parent = self.parent
+        while parent[pos] != pos:
+            parent[pos] = parent[parent[pos]]
+            pos = parent[pos]
+        return pos
+
+    def group(self, pos: GridPosition):
+        """Mask of the group holding the position, or 0 if it isn't in the set."""
+        if self.parent[pos] < 0:
+            return 0
+        return self.masks[self.find(pos)]
+
+    def add(self, pos: GridPosition):
+        bit = 1 << pos
+        adjacent = grid_adjacent_masks[pos] & self.members
+        self.members |= bit
+        if not adjacent:
+            self.parent[pos] = pos
+            self.masks[pos] = bit
+            return
+
+        # The largest neighbouring group absorbs the rest
+        roots = {self.find(adj) for adj in iter_bits(adjacent)}
+        root = max(roots, key=lambda r: self.masks[r].bit_count())
+        mask = bit
+        for other in roots:
+            other_mask = self.masks.pop(other)
+            self.large_groups -= other_mask.bit_count() >= 2
+            mask |= other_mask
+            self.parent[other] = root
+        self.parent[pos] = root
+        self.masks[root] = mask
+        self.large_groups += 1
+
+    def remove(self, pos: GridPosition):
+        bit = 1 << pos
+        self.members &= ~bit
+        mask = self.masks.pop(self.find(pos))
+        self.parent[pos] = -1
+        if mask == bit:
+            return
+
+        self.large_groups -= 1
+        for group in find_group_masks(mask & ~bit):
+            root = (group & -group).bit_length() - 1
+            for member in iter_bits(group):
+                self.parent[member] = root
+            self.masks[root] = group
+            self.large_groups += group.bit_count() >= 2
+
+
+# Stacks whose groups are kept as the board changes, for field and water scoring
+grouped_stacks = (Stack.FIELD1, Stack.WATER1)
+
+
+class CubeView:
+    """List-like view of the cube mask of a BitBoard."""
+
+    def __init__(self, board: "BitBoard"):
+        self._board = board
+
+    def __len__(self):
+        return grid_size
+
+    def __getitem__(self, pos: GridPosition):
+        return bool(self._board.cube_mask >> pos & 1)
+
+    def __setitem__(self, pos: GridPosition, value: bool):
+        if value != self[pos]:
+            board = self._board
+            board.cube_mask ^= 1 << pos
+            board.key ^= zobrist_cubes[pos]
+            # No token can go on a cube, so the cell leaves or rejoins the
+            # placement mask of every token its stack accepts
+            for token in board.cells[pos].placements:
+                board.placement_masks[token.index] ^= 1 << pos
+
+    def __iter__(self):
+        return (bool(self._board.cube_mask >> pos & 1) for pos in range(grid_size))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class BitBoard:
+    """Board stored as one bitmask per stack, also usable as a list of stacks.
+
+    The stack scoring components are kept up to date on every assignment, only
+    looking at the cells that an assignment could have affected.
+    """
+
+    masks: list[int]
+    cells: list[Stack]
+    cube_mask: int
+    # Groups of each stack in grouped_stacks, by stack index
+    stack_groups: list[StackGroups | None]
+    # Positions each token can be placed on, by token index
+    placement_masks: list[int]
+    key: int
+
+    trees: int
+    mountains: int
+    fields: int
+    buildings: int
+    water: int
+
+    def __init__(self):
+        self.masks = [0] * len(Stack)
+        self.masks[Stack.EMPTY0.index] = grid_mask
+        self.cells = [Stack.EMPTY0] * grid_size
+        self.cube_mask = 0
+        self.stack_groups = [None] * len(Stack)
+        for stack in grouped_stacks:
+            self.stack_groups[stack.index] = StackGroups()
+        self.placement_masks = [grid_mask] * len(Token)
+        self.key = 0
+
+        self.trees = 0
+        self.mountains = 0
+        self.fields = 0
+        self.buildings = 0
+        self.water = 0
+
+    def __len__(self):
+        return grid_size
+
+    def __getitem__(self, pos: GridPosition):
+        return self.cells[pos]
+
+    def __setitem__(self, pos: GridPosition, stack: Stack):
+        old_stack = self.cells[pos]
+        if old_stack == stack:
+            return
+
+        bit = 1 << pos
+        old_top, new_top = top_tokens[old_stack.index], top_tokens[stack.index]
+
+        # Only the cell itself can change unless its top token changes colour
+        mountain_region = building_region = 0
+        if mountain_values[old_stack.index] or mountain_values[stack.index]:
+            mountain_region = bit
+        if Stack.BUILD2 in (old_stack, stack):
+            building_region = bit
+        if old_top != new_top:
+            if Token.GRY in (old_top, new_top):
+                mountain_region |= grid_adjacent_masks[pos]
+            building_region |= grid_adjacent_masks[pos]
+
+        old_mountains = self._score_mountains_in(mountain_region)
+        old_buildings = self._score_buildings_in(building_region)
+
+        self.masks[old_stack.index] &= ~bit
+        self.masks[stack.index] |= bit
+        self.cells[pos] = stack
+        if not self.cube_mask & bit:
+            for token_index in _placement_changes[old_stack.index][stack.index]:
+                self.placement_masks[token_index] ^= bit
+        self.key ^= (
+            zobrist_stacks[pos][old_stack.index] ^ zobrist_stacks[pos][stack.index]
+        )
+
+        self.trees += tree_values[stack.index] - tree_values[old_stack.index]
+        self.mountains += self._score_mountains_in(mountain_region) - old_mountains
+        self.buildings += self._score_buildings_in(building_region) - old_buildings
+        old_groups = self.stack_groups[old_stack.index]
+        if old_groups:
+            old_groups.remove(pos)
+        new_groups = self.stack_groups[stack.index]
+        if new_groups:
+            new_groups.add(pos)
+        if Stack.FIELD1 in (old_stack, stack):
+            self.fields = 5 * self.stack_groups[Stack.FIELD1.index].large_groups
+        if Stack.WATER1 in (old_stack, stack):
+            # Rivers are the longest shortest path through a group, which the
+            # groups can't keep up to date, so that is still looked up by mask
+            self.water = self.score_water()
+
+    def _score_mountains_in(self, region: int):
+        gray = self.top_mask(Token.GRY)
+        region &= gray
+        if not region:
+            return 0
+        return sum(
+            mountain_values[self.cells[pos].index]
+            for pos in iter_bits(region)
+            if grid_adjacent_masks[pos] & gray
+        )
+
+    def _score_buildings_in(self, region: int):
+        region &= self.mask(Stack.BUILD2)
+        if not region:
+            return 0
+        top_masks = [self.top_mask(token) for token in Token]
+        return 5 * sum(
+            sum(bool(top & grid_adjacent_masks[pos]) for top in top_masks) >= 3
+            for pos in iter_bits(region)
+        )
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(self.cells)
+
+    @property
+    def cubes(self):
+        return CubeView(self)
+
+    def key_with(self, updated: dict[GridPosition, Stack]):
+        """The Zobrist key this board would have after assigning the given stacks."""
+        key = self.key
+        for pos, stack in updated.items():
+            keys = zobrist_stacks[pos]
+            key ^= keys[self.cells[pos].index] ^ keys[stack.index]
+        return key
+
+    def mask(self, stack: Stack):
+        return self.masks[stack.index]
+
+    def groups(self, stack: Stack):
+        """Groups kept for the stack, or None if it isn't in grouped_stacks."""
+        return self.stack_groups[stack.index]
+
+    def top_mask(self, token: Token):
+        result = 0
+        for index in _stacks_by_top[token]:
+            result |= self.masks[index]
+        return result
+
+    def placement_mask(self, token: Token):
+        """Positions the token can be placed on, kept up to date as cells change."""
+        return self.placement_masks[token.index]
+
+    def score_trees(self):
+        return sum(
+            value * self.mask(stack).bit_count() for stack, value in _tree_scoring
+        )
+
+    def score_mountains(self):
+        next_to_gray = neighbours(self.top_mask(Token.GRY))
+        return sum(
+            value * (self.mask(stack) & next_to_gray).bit_count()
+            for stack, value in _mountain_scoring
+        )
+
+    def score_fields(self):
+        return 5 * sum(
+            group.bit_count() >= 2
+            for group in find_group_masks(self.mask(Stack.FIELD1))
+        )
+
+    def score_buildings(self):
+        top_masks = [self.top_mask(token) for token in Token]
+        return 5 * sum(
+            sum(bool(top & grid_adjacent_masks[pos]) for top in top_masks) >= 3
+            for pos in iter_bits(self.mask(Stack.BUILD2))
+        )
+
+    def score_water(self):
+        return water_score(longest_river(self.mask(Stack.WATER1)))
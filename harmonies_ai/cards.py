@@ -1,5 +1,5 @@
 from enum import Enum
-from harmonies_ai.grid import Shape
+from harmonies_ai.grid import GridPosition, Shape, grid_size, shape_rotations
 from harmonies_ai.tokens import Stack
 
 M1 = Stack.MOUNT1
@@ -67,3 +67,47 @@ class AnimalCard(Enum):
     @property
     def num_cubes(self):
         return len(self.rewards)
+
+    def points(self, cubes_left: int):
+        """Points scored with the given number of cubes still on the card.
+
+        Cubes are taken from the lowest reward first, so each cube placed
+        uncovers the next higher one.
+        """
+        if cubes_left == self.num_cubes:
+            return 0
+        return self.rewards[cubes_left]
+
+    @property
+    def patterns(self):
+        patterns = _patterns.get(self)
+        if patterns is None:
+            patterns = _patterns[self] = _make_patterns(self)
+        return patterns
+
+
+# A rotation of a card's shape, as (stack index, required position mask) pairs
+Pattern = tuple[tuple[int, int], ...]
+
+
+def _make_pattern(card: AnimalCard, rotation: dict[GridPosition, int]) -> Pattern:
+    masks = dict[int, int]()
+    for pos, req in rotation.items():
+        index = card.reqs[req].index
+        masks[index] = masks.get(index, 0) | 1 << pos
+    return tuple(masks.items())
+
+
+def _make_patterns(card: AnimalCard):
+    return tuple(
+        tuple(
+            _make_pattern(card, rotation)
+            for rotation in shape_rotations[card.shape][pos]
+        )
+        for pos in range(grid_size)
+    )
+
+
+# Maps card then base position to every pattern that must be matched around it,
+# filled in the first time each card is used
+_patterns: dict[AnimalCard, tuple[tuple[Pattern, ...], ...]] = {}
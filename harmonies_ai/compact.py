@@ -0,0 +1,174 @@
+from collections import Counter
+from itertools import accumulate
+from harmonies_ai.bitboard import iter_bits
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+_tokens = tuple(Token)
+_stacks = tuple(Stack)
+_cards = tuple(AnimalCard)
+_card_indices = {card: i for i, card in enumerate(_cards)}
+
+
+def _card_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << _card_indices[card]
+    return mask
+
+
+def _mask_cards(mask: int):
+    return [_cards[i] for i in iter_bits(mask)]
+
+
+class CompactState:
+    """Immutable snapshot of a GameState, small enough to keep millions of.
+
+    Stacks, tokens and cards are stored by index: the board as 23 bytes, the
+    supply and display as short byte strings and sets of cards as bitmasks.
+    States are hashable, so they can be used directly as dict keys. The RNG and
+    the history of actions aren't kept, and held cards come back in card order.
+    """
+
+    __slots__ = (
+        "board",
+        "cubes",
+        "supply_tokens",
+        "supply_cards",
+        "display_tokens",
+        "display_cards",
+        "held_cards",
+        "cubes_left",
+        "completed_cards",
+        "placed_tokens",
+        "taken_card",
+        "turn",
+        "_hash",
+    )
+
+    # Stack index at each position
+    board: bytes
+    # Mask of the positions with a cube
+    cubes: int
+    # Tokens left in the supply, by token index
+    supply_tokens: bytes
+    # Cards left to draw, held and completed, as masks by card index
+    supply_cards: int
+    held_cards: int
+    completed_cards: int
+    # Token indices of the three sets on display, empty once the supply runs out
+    display_tokens: bytes
+    # Card indices on display, in display order
+    display_cards: bytes
+    # Cubes left on each held card, in card index order
+    cubes_left: bytes
+    # Token indices placed so far this turn, and whether a card was taken
+    placed_tokens: bytes
+    taken_card: bool
+    turn: int
+    _hash: int
+
+    def __init__(
+        self,
+        board: bytes,
+        cubes: int,
+        supply_tokens: bytes,
+        supply_cards: int,
+        display_tokens: bytes,
+        display_cards: bytes,
+        held_cards: int,
+        cubes_left: bytes,
+        completed_cards: int,
+        placed_tokens: bytes = b"",
+        taken_card: bool = False,
+        turn: int = 0,
+    ):
+        fields = (
+            board,
+            cubes,
+            supply_tokens,
+            supply_cards,
+            display_tokens,
+            display_cards,
+            held_cards,
+            cubes_left,
+            completed_cards,
+            placed_tokens,
+            taken_card,
+            turn,
+        )
+        for name, value in zip(self.__slots__, fields):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_hash", hash(fields))
+
+    def _fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__[:-1])
+
+    def __setattr__(self, name, value):
+        raise Exception("CompactState is immutable")
+
+    def __delattr__(self, name):
+        raise Exception("CompactState is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactState):
+            return NotImplemented
+        return self._hash == other._hash and self._fields() == other._fields()
+
+    def __repr__(self):
+        return f"CompactState(turn={self.turn}, board={self.board.hex()})"
+
+    def __reduce__(self):
+        return CompactState, self._fields()
+
+    @classmethod
+    def from_state(cls, gs: GameState):
+        held = sorted(gs.cards, key=_card_indices.__getitem__)
+        return cls(
+            board=bytes(stack.index for stack in gs.board),
+            cubes=gs.board.cube_mask,
+            supply_tokens=bytes(gs.supply_tokens[token] for token in _tokens),
+            supply_cards=_card_mask(gs.supply_cards),
+            display_tokens=bytes(
+                token.index for tokens in gs.display_tokens for token in tokens
+            ),
+            display_cards=bytes(_card_indices[card] for card in gs.display_cards),
+            held_cards=_card_mask(held),
+            cubes_left=bytes(gs.cards[card] for card in held),
+            completed_cards=_card_mask(gs.completed_cards),
+            placed_tokens=bytes(token.index for token in gs._placed_tokens),
+            taken_card=gs._taken_card,
+            turn=gs.turn,
+        )
+
+    def to_state(self, seed: int | None = None):
+        """Rebuild a GameState, drawing from a new RNG with the given seed."""
+        gs = GameState(seed)
+        for pos in range(grid_size):
+            gs.board[pos] = _stacks[self.board[pos]]
+        for pos in iter_bits(self.cubes):
+            gs.board.cubes[pos] = True
+
+        gs.supply_tokens = Counter(
+            {token: count for token, count in zip(_tokens, self.supply_tokens)}
+        )
+        gs._supply_cumulative = list(accumulate(self.supply_tokens))
+        gs.supply_cards = set(_mask_cards(self.supply_cards))
+        gs.display_tokens = tuple(
+            tuple(_tokens[i] for i in self.display_tokens[start : start + 3])
+            for start in range(0, len(self.display_tokens), 3)
+        )
+        gs.display_cards = [_cards[i] for i in self.display_cards]
+
+        gs.cards = dict(zip(_mask_cards(self.held_cards), self.cubes_left))
+        gs.completed_cards = _mask_cards(self.completed_cards)
+        gs._placed_tokens = tuple(_tokens[i] for i in self.placed_tokens)
+        gs._taken_card = self.taken_card
+        gs.turn = self.turn
+        return gs
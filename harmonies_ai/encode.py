@@ -0,0 +1,89 @@
+import numpy as np
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import GameState, initial_supply
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+_tokens = tuple(Token)
+_cards = tuple(AnimalCard)
+_card_indices = {card: i for i, card in enumerate(_cards)}
+_initial_supply = np.array([initial_supply[token] for token in _tokens], np.float32)
+_display_size = 9
+
+# Features are laid out in this order, each section starting where the last ends
+_sections = {
+    # One-hot stack at each position, by position then stack index
+    "stacks": grid_size * len(Stack),
+    "cubes": grid_size,
+    # Number of each token on display, out of the nine shown
+    "display": len(_tokens),
+    # Tokens left in the supply, out of the number a game starts with
+    "supply": len(_tokens),
+    # Cubes left on each held card, out of its total
+    "held": len(_cards),
+    "completed": len(_cards),
+    "turn": 1,
+}
+_offsets = dict(zip(_sections, np.cumsum([0, *_sections.values()])))
+feature_size = sum(_sections.values())
+
+# Rough number of turns in a game, to keep the turn feature near the unit range
+_turn_scale = 20
+
+
+def _encode_stacks(features: np.ndarray, boards: np.ndarray):
+    # Boards are (N, 23) stack indices and features (N, feature_size)
+    columns = np.arange(grid_size) * len(Stack) + boards
+    features[np.arange(len(boards))[:, None], columns] = 1
+
+
+def _encode_rest(gs: GameState, display: np.ndarray, supply: np.ndarray, turn: int):
+    features = np.zeros(feature_size, np.float32)
+    cubes = _offsets["cubes"]
+    features[cubes : cubes + grid_size] = list(gs.cubes)
+    features[_offsets["display"] : _offsets["display"] + len(_tokens)] = display
+    features[_offsets["supply"] : _offsets["supply"] + len(_tokens)] = supply
+    for card, cubes_left in gs.cards.items():
+        features[_offsets["held"] + _card_indices[card]] = cubes_left / card.num_cubes
+    for card in gs.completed_cards:
+        features[_offsets["completed"] + _card_indices[card]] = 1
+    features[_offsets["turn"]] = turn / _turn_scale
+    return features
+
+
+def _supply(gs: GameState):
+    return np.array([gs.supply_tokens[token] for token in _tokens], np.float32)
+
+
+def encode_state(gs: GameState):
+    """Encode a position as a vector of feature_size floats."""
+    display = np.zeros(len(_tokens), np.float32)
+    for tokens in gs.display_tokens:
+        for token in tokens:
+            display[token.index] += 1
+    features = _encode_rest(
+        gs, display / _display_size, _supply(gs) / _initial_supply, gs.turn
+    )
+    _encode_stacks(features[None], np.array([[stack.index for stack in gs.board]]))
+    return features
+
+
+def encode_next_turns(gs: GameState, boards: np.ndarray):
+    """Encode the positions at the start of the next turn, one per board.
+
+    Boards are (N, 23) stack indices after each possible turn. The next display
+    isn't drawn yet, so it is encoded as its expected value, nine tokens drawn in
+    proportion to the supply, which is reduced by the same expected draw.
+    """
+    supply = _supply(gs)
+    total = supply.sum()
+    if total >= _display_size:
+        display = supply / total
+        supply = supply * (1 - _display_size / total)
+    else:
+        display = np.zeros(len(_tokens), np.float32)
+    features = _encode_rest(gs, display, supply / _initial_supply, gs.turn + 1)
+    features = np.tile(features, (len(boards), 1))
+    _encode_stacks(features, np.asarray(boards))
+    return features
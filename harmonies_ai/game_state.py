@@ -1,17 +1,13 @@
+from bisect import bisect_right
+from contextlib import contextmanager
 from copy import deepcopy
-from typing import Counter, NamedTuple
-from random import choice, choices, sample
+from itertools import accumulate
+from typing import Any, Counter, NamedTuple
+from random import Random, getrandbits
+from harmonies_ai import instrument
+from harmonies_ai.bitboard import BitBoard, find_group_masks, iter_bits, longest_river
 from harmonies_ai.cards import AnimalCard
-from harmonies_ai.grid import (
-    Grid,
-    GridPosition,
-    Shape,
-    grid_size,
-    doubled_coords,
-    grid_adjacent,
-    shape_rotations,
-)
-from harmonies_ai.rich_canvas import Pixel, RichCanvas
+from harmonies_ai.grid import Grid, GridPosition, grid_size, grid_adjacent
 from harmonies_ai.tokens import Stack, Token
 
 
@@ -54,22 +50,58 @@ class PlaceCubeAction(NamedTuple):
     pos: GridPosition
 
 
-Action = PlaceTokenAction | TakeCardAction | PlaceCubeAction
+class EndTurnAction(NamedTuple):
+    pass
+
+
+Action = (
+    PlaceTokenAction
+    | TakeCardAction
+    | DiscardCardAction
+    | PlaceCubeAction
+    | EndTurnAction
+)
+
+
+# Tokens in the bag at the start of a game
+initial_supply = {
+    Token.GRY: 23,
+    Token.RED: 15,
+    Token.BRN: 21,
+    Token.GRN: 19,
+    Token.BLU: 23,
+    Token.YLW: 19,
+}
+
+_tokens = tuple(Token)
+_token_indices = {token: i for i, token in enumerate(_tokens)}
 
 
 class GameState:
+    # Check running_score against a full recalculation every time it is read
+    debug_scoring = False
+
     _placed_tokens: tuple[Token, ...]
     _taken_card: bool
+    _journal: list[tuple[Any, ...]]
+    _fork_seed: int
+    _forks: int
+    _exploring: int
+
+    rng: Random
 
     supply_tokens: Counter[Token]
+    _supply_cumulative: list[int]
     supply_cards: set[AnimalCard]
 
     display_tokens: tuple[tuple[Token, ...], ...]
     display_cards: list[AnimalCard]
 
     cards: dict[AnimalCard, int]
-    cubes: Grid[bool]
-    board: Grid[Stack]
+    completed_cards: list[AnimalCard]
+    board: BitBoard
+
+    turn: int
 
     @classmethod
     def random(
@@ -77,11 +109,13 @@ class GameState:
         stack_options=[s for s in Stack if s != Stack.EMPTY0],
         num_stacks=20,
         num_cubes=10,
+        seed: int | None = None,
     ):
-        instance = cls()
-        for pos in sample(range(grid_size), k=num_stacks):
-            instance.board[pos] = choice(stack_options)
-        for pos in sample(
+        instance = cls(seed)
+        rng = instance.rng
+        for pos in rng.sample(range(grid_size), k=num_stacks):
+            instance.board[pos] = rng.choice(stack_options)
+        for pos in rng.sample(
             [p for p, s in enumerate(instance.board) if s != Stack.EMPTY0],
             k=num_cubes,
         ):
@@ -89,21 +123,40 @@ class GameState:
         return instance
 
     def copy(self):
-        return deepcopy(self)
+        """Copy the state with a forked RNG, so draws on the copy are independent."""
+        if instrument.enabled:
+            instrument.count("copies")
+        rng = self.fork_rng()
+        # Journal entries are immutable, so only the list itself needs copying
+        memo = {id(self.rng): rng, id(self._journal): list(self._journal)}
+        instance = deepcopy(self, memo)
+        instance._fork_seed = rng.getrandbits(64)
+        instance._forks = 0
+        return instance
 
-    def __init__(self):
+    def fork_rng(self):
+        """Make a new RNG derived from this state's without advancing it."""
+        self._forks += 1
+        return Random(self._fork_seed << 32 | self._forks)
+
+    def __init__(self, seed: int | None = None, rng: Random | None = None):
         self._placed_tokens = ()
         self._taken_card = False
+        self._journal = []
+
+        # Without a seed or RNG, seed from the global random module so that
+        # random.seed still gives reproducible games
+        if rng is None:
+            rng = Random(getrandbits(64) if seed is None else seed)
+        self.rng = rng
+        self._fork_seed = self.rng.getrandbits(64)
+        self._forks = 0
+        self._exploring = 0
+
+        self.supply_tokens = Counter(initial_supply)
 
-        self.supply_tokens = Counter(
-            {
-                Token.GRY: 23,
-                Token.RED: 15,
-                Token.BRN: 21,
-                Token.GRN: 19,
-                Token.BLU: 23,
-                Token.YLW: 19,
-            }
+        self._supply_cumulative = list(
+            accumulate(self.supply_tokens[token] for token in Token)
         )
 
         self.supply_cards = set(AnimalCard)
@@ -112,20 +165,33 @@ class GameState:
         self._refresh_display()
 
         self.cards = {}
-        self.cubes = [False] * grid_size
-        self.board = [Stack.EMPTY0] * grid_size
+        self.completed_cards = []
+        self.board = BitBoard()
+
+        self.turn = 0
+
+    @property
+    def cubes(self) -> Grid[bool]:
+        return self.board.cubes
+
+    @property
+    def key(self):
+        """Zobrist key of the board and cubes, maintained as they change."""
+        return self.board.key
+
+    def _adjust_supply(self, token: Token, count: int):
+        self.supply_tokens[token] += count
+        for i in range(_token_indices[token], len(_tokens)):
+            self._supply_cumulative[i] += count
 
     def _draw_token(self):
-        token = choices(
-            population=list(self.supply_tokens.keys()),
-            weights=list(self.supply_tokens.values()),
-            k=1,
-        )[0]
-        self.supply_tokens[token] -= 1
+        draw = self.rng.randrange(self._supply_cumulative[-1])
+        token = _tokens[bisect_right(self._supply_cumulative, draw)]
+        self._adjust_supply(token, -1)
         return token
 
     def _draw_card(self):
-        card = choice(tuple(self.supply_cards))
+        card = self.rng.choice([c for c in AnimalCard if c in self.supply_cards])
         self.supply_cards.remove(card)
         return card
 
@@ -133,7 +199,7 @@ class GameState:
         while len(self.display_cards) < 4:
             self.display_cards.append(self._draw_card())
 
-        if sum(self.supply_tokens.values()) < 9:
+        if self._supply_cumulative[-1] < 9:
             self.display_tokens = ()
         else:
             self.display_tokens = tuple(
@@ -146,12 +212,40 @@ class GameState:
             all(npt in dts for npt in new_placed_tokens) for dts in self.display_tokens
         ):
             raise Exception("Token not available from the display")
+        self._journal.append(
+            (
+                PlaceTokenAction(token, pos),
+                GameState._undo_place_token,
+                pos,
+                self.board[pos],
+                self._placed_tokens,
+            )
+        )
+        self._place_token(token, pos)
+        self._placed_tokens = new_placed_tokens
+        if instrument.enabled:
+            instrument.count("tokens_placed")
+        return self
+
+    def _undo_place_token(
+        self, pos: GridPosition, stack: Stack, placed_tokens: tuple[Token, ...]
+    ):
+        self.board[pos] = stack
+        self._placed_tokens = placed_tokens
+
+    def placement_mask(self, token: Token):
+        """Bitmask of the positions where the token can be placed."""
+        return self.board.placement_mask(token)
+
+    def legal_token_positions(self, token: Token):
+        """Positions where the token can be placed, in position order."""
+        return list(iter_bits(self.board.placement_mask(token)))
+
+    def _place_token(self, token: Token, pos: GridPosition):
         stack = self.board[pos]
         if token not in stack.placements:
             raise Exception(f"Cannot place {token} on {stack}")
         self.board[pos] = stack.placements[token]
-        self._placed_tokens = new_placed_tokens
-        return self
 
     def take_card(self, card: AnimalCard):
         if self._taken_card:
@@ -160,28 +254,66 @@ class GameState:
             raise Exception("Cannot take more than 4 cards")
         if card not in self.display_cards:
             raise Exception("Card not in display")
+        self._journal.append(
+            (
+                TakeCardAction(card),
+                GameState._undo_take_card,
+                card,
+                self.display_cards.index(card),
+            )
+        )
         self.cards[card] = card.num_cubes
         self.display_cards.remove(card)
         self._taken_card = True
         return self
 
+    def _undo_take_card(self, card: AnimalCard, display_index: int):
+        del self.cards[card]
+        self._undo_discard_card(card, display_index)
+
     def discard_card(self, card: AnimalCard):
         if self._taken_card:
             raise Exception("Cannot take/discard more than one card per turn")
         if card not in self.display_cards:
             raise Exception("Card not in display")
+        self._journal.append(
+            (
+                DiscardCardAction(card),
+                GameState._undo_discard_card,
+                card,
+                self.display_cards.index(card),
+            )
+        )
         self.display_cards.remove(card)
         self._taken_card = True
         return self
 
+    def _undo_discard_card(self, card: AnimalCard, display_index: int):
+        self.display_cards.insert(display_index, card)
+        self._taken_card = False
+
     def could_place_cube(self, card: AnimalCard, pos: GridPosition):
         if self.board[pos] != card.base:
             return False
+        masks = self.board.masks
         return any(
-            all(self.board[p] == card.reqs[v] for p, v in rotation.items())
-            for rotation in shape_rotations[card.shape][pos]
+            all(masks[index] & mask == mask for index, mask in pattern)
+            for pattern in card.patterns[pos]
         )
 
+    def legal_cube_placements(self):
+        """Every (card, pos) pair where a cube from a held card could be placed."""
+        masks = self.board.masks
+        return [
+            (card, pos)
+            for card in self.cards
+            for pos in iter_bits(self.board.mask(card.base) & ~self.board.cube_mask)
+            if any(
+                all(masks[index] & mask == mask for index, mask in pattern)
+                for pattern in card.patterns[pos]
+            )
+        ]
+
     def place_cube(self, card: AnimalCard, pos: GridPosition):
         if card not in self.cards:
             raise Exception("Card not in available cards")
@@ -191,20 +323,105 @@ class GameState:
             raise Exception("Cube already placed at that position")
         if not self.could_place_cube(card, pos):
             raise Exception("Requirements for animal card are not met")
+        self._journal.append(
+            (PlaceCubeAction(card, pos), GameState._undo_place_cube, card, pos)
+        )
         self.cubes[pos] = True
         self.cards[card] -= 1
         if self.cards[card] == 0:
             del self.cards[card]
+            self.completed_cards.append(card)
         return self
 
+    def _undo_place_cube(self, card: AnimalCard, pos: GridPosition):
+        self.cubes[pos] = False
+        if card not in self.cards:
+            self.completed_cards.remove(card)
+        self.cards[card] = self.cards.get(card, 0) + 1
+
     def end_turn(self):
         if len(self._placed_tokens) != 3:
             raise Exception("Must place exactly 3 tokens every turn")
+        self._journal.append(
+            (
+                EndTurnAction(),
+                GameState._undo_end_turn,
+                self._placed_tokens,
+                self._taken_card,
+                self.display_tokens,
+                len(self.display_cards),
+            )
+        )
         self._placed_tokens = ()
         self._taken_card = False
         self._refresh_display()
+        self.turn += 1
+        if instrument.log_turns and not self._exploring:
+            instrument.record_turn(self.turn)
+        return self
+
+    def _undo_end_turn(
+        self,
+        placed_tokens: tuple[Token, ...],
+        taken_card: bool,
+        display_tokens: tuple[tuple[Token, ...], ...],
+        num_display_cards: int,
+    ):
+        for tokens in self.display_tokens:
+            for token in tokens:
+                self._adjust_supply(token, 1)
+        self.supply_cards.update(self.display_cards[num_display_cards:])
+        del self.display_cards[num_display_cards:]
+        self.display_tokens = display_tokens
+        self._placed_tokens = placed_tokens
+        self._taken_card = taken_card
+        self.turn -= 1
+
+    def undo(self):
+        """Revert the most recent action, including any cards and tokens drawn.
+
+        The RNG is not rewound, so redoing an end_turn will draw differently.
+        """
+        _, undo_action, *args = self._journal.pop()
+        undo_action(self, *args)
         return self
 
+    @property
+    def history(self) -> list[Action]:
+        """Every action taken so far, which replays the game from its seed."""
+        return [action for action, *_ in self._journal]
+
+    def apply(self, action: Action):
+        match action:
+            case PlaceTokenAction(token, pos):
+                return self.place_token(token, pos)
+            case TakeCardAction(card):
+                return self.take_card(card)
+            case DiscardCardAction(card):
+                return self.discard_card(card)
+            case PlaceCubeAction(card, pos):
+                return self.place_cube(card, pos)
+            case EndTurnAction():
+                return self.end_turn()
+
+    @contextmanager
+    def explore(self):
+        """Undo every action taken inside the block when it exits.
+
+        Draws inside the block use a forked RNG, so exploring doesn't change the
+        tokens and cards that the real game goes on to draw.
+        """
+        mark = len(self._journal)
+        rng, self.rng = self.rng, self.fork_rng()
+        self._exploring += 1
+        try:
+            yield self
+        finally:
+            while len(self._journal) > mark:
+                self.undo()
+            self.rng = rng
+            self._exploring -= 1
+
     def get_adjacent_tokens(self, pos: GridPosition):
         return {
             self.board[adj_pos].components[-1]
@@ -213,206 +430,71 @@ class GameState:
         }
 
     def find_groups(self, stack: Stack):
-        matching = {pos for pos, s in enumerate(self.board) if s == stack}
-        groups: list[set[int]] = []
-
-        while matching:
-            first_item = matching.pop()
-            current_group = {first_item}
-            frontier = {pos for pos in grid_adjacent[first_item] if pos in matching}
-
-            while frontier:
-                next_item = frontier.pop()
-                current_group.add(next_item)
-                matching.remove(next_item)
-                frontier.update(
-                    pos for pos in grid_adjacent[next_item] if pos in matching
-                )
-
-            groups.append(current_group)
+        """Connected groups of the stack, ordered by their lowest position."""
+        groups = self.board.groups(stack)
+        if groups is None:
+            masks = find_group_masks(self.board.mask(stack))
+        else:
+            masks = sorted(groups.masks.values(), key=lambda mask: mask & -mask)
+        return [set(iter_bits(mask)) for mask in masks]
 
-        return groups
+    def group_of(self, stack: Stack, pos: GridPosition):
+        """Mask of the group holding the position, for stacks with kept groups."""
+        return self.board.groups(stack).group(pos)
 
     def find_longest_river(self):
-        longest_river = 0
-
-        for group in self.find_groups(Stack.WATER1):
-            for start in group:
-                length = 0
-                explored = set[int]()
-                frontier = {start}
-
-                while frontier:
-                    length += 1
-                    explored.update(frontier)
-                    frontier = {
-                        apos
-                        for pos in frontier
-                        for apos in grid_adjacent[pos]
-                        if apos in group and apos not in explored
-                    }
-
-                longest_river = max(longest_river, length)
-
-        return longest_river
+        return longest_river(self.board.mask(Stack.WATER1))
 
     @property
     def game_ended(self):
-        return (
-            sum(stack == Stack.EMPTY0 for stack in self.board) <= 2
-            or not self.display_tokens
-        )
+        return self.board.mask(Stack.EMPTY0).bit_count() <= 2 or not self.display_tokens
 
     @property
     def score(self):
-        tree_scoring = {Stack.TREES1: 1, Stack.TREES2: 3, Stack.TREES3: 7}
-        trees = sum(
-            tree_scoring[stack] for stack in self.board if stack in tree_scoring
-        )
-
-        mountain_scoring = {Stack.MOUNT1: 1, Stack.MOUNT2: 3, Stack.MOUNT3: 7}
-        mountains = sum(
-            mountain_scoring[stack]
-            for pos, stack in enumerate(self.board)
-            if stack in mountain_scoring and Token.GRY in self.get_adjacent_tokens(pos)
+        if instrument.enabled:
+            return self._timed_score()
+        return Score(
+            trees=self.board.score_trees(),
+            mountains=self.board.score_mountains(),
+            fields=self.board.score_fields(),
+            buildings=self.board.score_buildings(),
+            water=self.board.score_water(),
+            cards=self.card_points(),
         )
 
-        fields = 5 * sum(len(group) >= 2 for group in self.find_groups(Stack.FIELD1))
-
-        buildings = 5 * sum(
-            len(self.get_adjacent_tokens(pos)) >= 3
-            for pos, stack in enumerate(self.board)
-            if stack == Stack.BUILD2
+    def card_points(self):
+        """Points for each card taken, held or completed."""
+        return (
+            *(card.points(cubes_left) for card, cubes_left in self.cards.items()),
+            *(card.points(0) for card in self.completed_cards),
         )
 
-        water_scoring = [0, 0, 2, 5, 8, 11, 15]
-        longest_river = self.find_longest_river()
-        water = (
-            water_scoring[longest_river]
-            if longest_river < len(water_scoring)
-            else water_scoring[-1] + 4 * (longest_river - len(water_scoring) + 1)
-        )
+    def _timed_score(self):
+        instrument.count("scores")
+        components = {}
+        for name in ("trees", "mountains", "fields", "buildings", "water"):
+            with instrument.timed(f"score_{name}"):
+                components[name] = getattr(self.board, f"score_{name}")()
+        return Score(**components, cards=self.card_points())
 
-        return Score(
-            trees=trees,
-            mountains=mountains,
-            fields=fields,
-            buildings=buildings,
-            water=water,
-            cards=(),
+    @property
+    def running_score(self):
+        if instrument.enabled:
+            instrument.count("running_scores")
+        score = Score(
+            trees=self.board.trees,
+            mountains=self.board.mountains,
+            fields=self.board.fields,
+            buildings=self.board.buildings,
+            water=self.board.water,
+            cards=self.card_points(),
         )
+        if self.debug_scoring and score != self.score:
+            raise Exception(f"Running score {score} does not match {self.score}")
+        return score
 
     def __rich__(self):
-        board_bg = "#997C54"
-        board_empty = "#EDCD9C"
-        cube_bg = "#E67C20"
-
-        canvas = RichCanvas()
-
-        pattern_templates = {
-            Shape.PAIR: [
-                "             ",
-                "        D    ",
-                "   ggg cCc   ",
-                "   fff bBb   ",
-                "   eee aaa   ",
-                "             ",
-                "             ",
-            ],
-            Shape.TRIANGLE: [
-                "             ",
-                "   fff  D    ",
-                "   eee cCc   ",
-                "       bBb   ",
-                "   fff aaa   ",
-                "   eee       ",
-                "             ",
-            ],
-            Shape.DIAMOND: [
-                "             ",
-                "      C      ",
-                "     bBb     ",
-                "     aaa     ",
-                " eee     eee ",
-                "     eee     ",
-                "             ",
-            ],
-            Shape.BOOMERANG: [
-                "             ",
-                "      D      ",
-                "     cCc     ",
-                "     bBb     ",
-                " fff aaa fff ",
-                " eee     eee ",
-                "             ",
-            ],
-            Shape.LINE: [
-                "             ",
-                "          D  ",
-                " jjj ggg cCc ",
-                " iii fff bBb ",
-                " hhh eee aaa ",
-                "             ",
-                "             ",
-            ],
-        }
-
-        for gi, group in enumerate(self.display_tokens):
-            canvas.draw_rect((gi * 4, 2), (3, 15), board_empty)
-            for ti, token in enumerate(group):
-                canvas.draw_rect((1 + gi * 4, 4 + ti * 4), (1, 3), token.bg)
-
-        for ci, card in enumerate(self.display_cards):
-            labels = dict[str, Pixel]({c: board_empty for c in " abcdefghij"})
-            labels.update(zip("abc", card.base.components))
-            labels.update(zip("efg", card.reqs[0].components))
-            if len(card.reqs) > 1:
-                labels.update(zip("hij", card.reqs[1].components))
-            labels["BCD"[len(card.base.components) - 1]] = cube_bg
-
-            card_left = 19 + 15 * ci
-
-            canvas.draw_template((0, card_left), pattern_templates[card.shape], labels)
-
-            canvas.draw_text(
-                (7, card_left), card.name.center(13), bg=board_empty, fg="black"
-            )
-            canvas.draw_text(
-                (8, card_left),
-                " ".join(str(r) for r in card.rewards).center(13),
-                bg=board_empty,
-                fg="black",
-            )
-            canvas.draw_rect((9, card_left), (1, 13), board_empty)
-
-        canvas.advance_origin(1)
-
-        hex_template = [
-            "  ..........  ",
-            " .....DD..... ",
-            "....ccCCcc....",
-            "....bbBBbb....",
-            " ...aaaaaa... ",
-            "  ..........  ",
-        ]
-
-        hex_height, hex_width = len(hex_template), len(hex_template[0])
-
-        canvas.draw_rect((0, 0), (hex_height * 5 + 6, hex_width * 5 + 8), board_bg)
-
-        for i, (stack, cube) in enumerate(zip(self.board, self.cubes)):
-            hex_yd, hex_x = doubled_coords[i]
-            start_y = 1 + hex_yd * (hex_height + 1) // 2
-            start_x = 2 + hex_x * (hex_width + 1)
-
-            labels = dict[str, Pixel]({c: board_empty for c in ".abcd"})
-            labels.update(zip("abc", stack.components))
-            if cube:
-                labels["BCD"[len(stack.components) - 1]] = cube_bg
-
-            canvas.draw_template((start_y, start_x), hex_template, labels)
-            canvas.draw_text(
-                (start_y + 5, start_x + 6), str(i).rjust(2, "0"), board_empty, board_bg
-            )
+        # Rendering pulls in rich, so only import it once something is displayed
+        from harmonies_ai.render import render_game_state
 
-        return canvas
+        return render_game_state(self)
@@ -17,14 +17,27 @@ doubled_coords = tuple(
 
 adjacent_steps = ((-2, 0), (-1, 1), (1, 1), (2, 0), (1, -1), (-1, -1))
 
+# Maps doubled coordinates back to positions
+doubled_positions = {doubled: pos for pos, doubled in enumerate(doubled_coords)}
+
 # Maps positions to all positions that are adjacent to it
 grid_adjacent = tuple(
     tuple(
-        adj_pos
-        for adj_pos, adj_doubled in enumerate(doubled_coords)
-        if (adj_doubled[0] - doubled[0], adj_doubled[1] - doubled[1]) in adjacent_steps
+        sorted(
+            doubled_positions[(y + dy, x + dx)]
+            for dy, dx in adjacent_steps
+            if (y + dy, x + dx) in doubled_positions
+        )
     )
-    for doubled in doubled_coords
+    for y, x in doubled_coords
+)
+
+# Bitmask with one bit set for every position on the grid
+grid_mask = (1 << grid_size) - 1
+
+# Maps positions to a bitmask of all positions that are adjacent to it
+grid_adjacent_masks = tuple(
+    sum(1 << adj_pos for adj_pos in adjacent) for adjacent in grid_adjacent
 )
 
 # Maps positions within two steps of origin to 60 degree clockwise rotation
@@ -61,16 +74,14 @@ class Shape(Enum):
 
 
 def _rotate_shape(shape: Shape, pos: GridPosition):
+    y, x = doubled_coords[pos]
     for steps in range(6):
-        rotated = {
-            (
-                rotate(hp, steps)[0] + doubled_coords[pos][0],
-                rotate(hp, steps)[1] + doubled_coords[pos][1],
-            ): v
-            for hp, v in shape.positions.items()
-        }
-        if all(hp in doubled_coords for hp in rotated):
-            yield {doubled_coords.index(hp): v for hp, v in rotated.items()}
+        rotated = {}
+        for hp, v in shape.positions.items():
+            ry, rx = rotate(hp, steps)
+            rotated[(ry + y, rx + x)] = v
+        if all(hp in doubled_positions for hp in rotated):
+            yield {doubled_positions[hp]: v for hp, v in rotated.items()}
 
 
 # Maps shape then position to tuple of all rotated shapes that fit in grid
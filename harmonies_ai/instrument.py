@@ -0,0 +1,61 @@
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any
+
+
+# Hot paths check this before recording anything, so leaving it off costs one
+# attribute lookup per check. Counts are kept per process.
+enabled = False
+# Log each turn's time, and counter deltas if enabled, when a turn ends. This
+# is only checked once a turn, so it can be on without slowing games down.
+log_turns = False
+
+counters = Counter[str]()
+timers = Counter[str]()
+turn_log: list[dict[str, Any]] = []
+
+_turn_start = 0.0
+_turn_counters = Counter[str]()
+
+
+def reset():
+    """Clear everything recorded so far, ready for a new game."""
+    global _turn_start
+    counters.clear()
+    timers.clear()
+    turn_log.clear()
+    _turn_counters.clear()
+    _turn_start = perf_counter()
+
+
+def count(name: str, amount: int = 1):
+    counters[name] += amount
+
+
+@contextmanager
+def timed(name: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timers[name] += perf_counter() - start
+
+
+def record_turn(turn: int):
+    """Log the time taken and the counts recorded since the previous turn ended."""
+    global _turn_start, _turn_counters
+    now = perf_counter()
+    turn_log.append(
+        {
+            "turn": turn,
+            "seconds": now - _turn_start,
+            **(counters - _turn_counters),
+        }
+    )
+    _turn_start = now
+    _turn_counters = counters.copy()
+
+
+def snapshot():
+    return {"counters": dict(counters), "timers": dict(timers)}
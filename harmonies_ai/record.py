@@ -0,0 +1,185 @@
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import (
+    Action,
+    DiscardCardAction,
+    EndTurnAction,
+    GameState,
+    PlaceCubeAction,
+    PlaceTokenAction,
+    TakeCardAction,
+)
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Token
+
+
+# Each action is one byte, apart from cubes which take a second byte for the
+# position. The first byte is split into ranges by action type:
+#
+#   0..137    PlaceToken, token index * 23 + position
+#   138..169  TakeCard, card index
+#   170..201  DiscardCard, card index
+#   202..233  PlaceCube, card index, followed by a position byte
+#   255       EndTurn
+_tokens = tuple(Token)
+_cards = tuple(AnimalCard)
+_token_indices = {token: i for i, token in enumerate(_tokens)}
+_card_indices = {card: i for i, card in enumerate(_cards)}
+
+_take_card = len(_tokens) * grid_size
+_discard_card = _take_card + len(_cards)
+_place_cube = _discard_card + len(_cards)
+_end_turn = 255
+
+# Each record is a header of seed and number of action bytes, then the actions
+_header = struct.Struct("<QH")
+# The index holds the offset of every record in the records file
+_offset = struct.Struct("<Q")
+
+
+def encode_actions(actions: Iterable[Action]):
+    data = bytearray()
+    for action in actions:
+        match action:
+            case PlaceTokenAction(token, pos):
+                data.append(_token_indices[token] * grid_size + pos)
+            case TakeCardAction(card):
+                data.append(_take_card + _card_indices[card])
+            case DiscardCardAction(card):
+                data.append(_discard_card + _card_indices[card])
+            case PlaceCubeAction(card, pos):
+                data += bytes((_place_cube + _card_indices[card], pos))
+            case EndTurnAction():
+                data.append(_end_turn)
+            case _:
+                raise Exception(f"Cannot encode {action}")
+    return bytes(data)
+
+
+def decode_actions(data: bytes) -> Iterator[Action]:
+    i = 0
+    while i < len(data):
+        code = data[i]
+        i += 1
+        if code < _take_card:
+            yield PlaceTokenAction(_tokens[code // grid_size], code % grid_size)
+        elif code < _discard_card:
+            yield TakeCardAction(_cards[code - _take_card])
+        elif code < _place_cube:
+            yield DiscardCardAction(_cards[code - _discard_card])
+        elif code < _place_cube + len(_cards):
+            yield PlaceCubeAction(_cards[code - _place_cube], data[i])
+            i += 1
+        elif code == _end_turn:
+            yield EndTurnAction()
+        else:
+            raise Exception(f"Invalid action code {code}")
+
+
+class GameRecord(NamedTuple):
+    """Seed of a game and the actions taken, enough to replay it exactly."""
+
+    seed: int
+    actions: bytes
+
+    @classmethod
+    def from_state(cls, seed: int, gs: GameState):
+        return cls(seed, encode_actions(gs.history))
+
+    def to_bytes(self):
+        return _header.pack(self.seed, len(self.actions)) + self.actions
+
+    def replay(self, turn: int | None = None):
+        """Rebuild the game, stopping at the start of the given turn if there is one."""
+        gs = GameState(self.seed)
+        for action in decode_actions(self.actions):
+            if gs.turn == turn:
+                break
+            gs.apply(action)
+        return gs
+
+
+def _index_path(path: Path):
+    return path.with_name(path.name + ".idx")
+
+
+class RecordWriter:
+    """Appends game records to a file, with an index of record offsets next to it."""
+
+    _records: BinaryIO
+    _index: BinaryIO
+
+    def __init__(self, path: Path | str):
+        self._records = open(path, "ab")
+        self._index = open(_index_path(Path(path)), "ab")
+
+    def append(self, record: GameRecord):
+        self._index.write(_offset.pack(self._records.tell()))
+        self._records.write(record.to_bytes())
+
+    def close(self):
+        self._records.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordReader:
+    """Random access to the game records in a file written by RecordWriter.
+
+    Records are indexed in the order they were written, which for a run with
+    several workers is the order games finished in, not game number order. Use
+    find to look a game up by its seed.
+    """
+
+    _records: BinaryIO
+    _index: bytes
+    _seeds: dict[int, int] | None
+
+    def __init__(self, path: Path | str):
+        self._records = open(path, "rb")
+        self._index = _index_path(Path(path)).read_bytes()
+        self._seeds = None
+
+    def __len__(self):
+        return len(self._index) // _offset.size
+
+    def _read_header(self, index: int):
+        (offset,) = _offset.unpack_from(self._index, index * _offset.size)
+        self._records.seek(offset)
+        return _header.unpack(self._records.read(_header.size))
+
+    def __getitem__(self, index: int):
+        if not 0 <= index < len(self):
+            raise IndexError(f"No record {index} in {len(self)} records")
+        seed, length = self._read_header(index)
+        return GameRecord(seed, self._records.read(length))
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def find(self, seed: int):
+        """The record of the game played from a seed, as made by game_seed."""
+        if self._seeds is None:
+            # Only the headers are read, once, the first time a seed is looked up
+            self._seeds = {
+                self._read_header(index)[0]: index for index in range(len(self))
+            }
+        if seed not in self._seeds:
+            raise KeyError(f"No game with seed {seed}")
+        return self[self._seeds[seed]]
+
+    def close(self):
+        self._records.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
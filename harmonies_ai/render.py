@@ -0,0 +1,119 @@
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import Shape, doubled_coords
+from harmonies_ai.rich_canvas import Pixel, RichCanvas
+
+
+def render_game_state(gs: GameState):
+    board_bg = "#997C54"
+    board_empty = "#EDCD9C"
+    cube_bg = "#E67C20"
+
+    canvas = RichCanvas()
+
+    pattern_templates = {
+        Shape.PAIR: [
+            "             ",
+            "        D    ",
+            "   ggg cCc   ",
+            "   fff bBb   ",
+            "   eee aaa   ",
+            "             ",
+            "             ",
+        ],
+        Shape.TRIANGLE: [
+            "             ",
+            "   fff  D    ",
+            "   eee cCc   ",
+            "       bBb   ",
+            "   fff aaa   ",
+            "   eee       ",
+            "             ",
+        ],
+        Shape.DIAMOND: [
+            "             ",
+            "      C      ",
+            "     bBb     ",
+            "     aaa     ",
+            " eee     eee ",
+            "     eee     ",
+            "             ",
+        ],
+        Shape.BOOMERANG: [
+            "             ",
+            "      D      ",
+            "     cCc     ",
+            "     bBb     ",
+            " fff aaa fff ",
+            " eee     eee ",
+            "             ",
+        ],
+        Shape.LINE: [
+            "             ",
+            "          D  ",
+            " jjj ggg cCc ",
+            " iii fff bBb ",
+            " hhh eee aaa ",
+            "             ",
+            "             ",
+        ],
+    }
+
+    for gi, group in enumerate(gs.display_tokens):
+        canvas.draw_rect((gi * 4, 2), (3, 15), board_empty)
+        for ti, token in enumerate(group):
+            canvas.draw_rect((1 + gi * 4, 4 + ti * 4), (1, 3), token.bg)
+
+    for ci, card in enumerate(gs.display_cards):
+        labels = dict[str, Pixel]({c: board_empty for c in " abcdefghij"})
+        labels.update(zip("abc", card.base.components))
+        labels.update(zip("efg", card.reqs[0].components))
+        if len(card.reqs) > 1:
+            labels.update(zip("hij", card.reqs[1].components))
+        labels["BCD"[len(card.base.components) - 1]] = cube_bg
+
+        card_left = 19 + 15 * ci
+
+        canvas.draw_template((0, card_left), pattern_templates[card.shape], labels)
+
+        canvas.draw_text(
+            (7, card_left), card.name.center(13), bg=board_empty, fg="black"
+        )
+        canvas.draw_text(
+            (8, card_left),
+            " ".join(str(r) for r in card.rewards).center(13),
+            bg=board_empty,
+            fg="black",
+        )
+        canvas.draw_rect((9, card_left), (1, 13), board_empty)
+
+    canvas.advance_origin(1)
+
+    hex_template = [
+        "  ..........  ",
+        " .....DD..... ",
+        "....ccCCcc....",
+        "....bbBBbb....",
+        " ...aaaaaa... ",
+        "  ..........  ",
+    ]
+
+    hex_height, hex_width = len(hex_template), len(hex_template[0])
+
+    canvas.draw_rect((0, 0), (hex_height * 5 + 6, hex_width * 5 + 8), board_bg)
+
+    for i, (stack, cube) in enumerate(zip(gs.board, gs.cubes)):
+        hex_yd, hex_x = doubled_coords[i]
+        start_y = 1 + hex_yd * (hex_height + 1) // 2
+        start_x = 2 + hex_x * (hex_width + 1)
+
+        labels = dict[str, Pixel]({c: board_empty for c in ".abcd"})
+        labels.update(zip("abc", stack.components))
+        if cube:
+            labels["BCD"[len(stack.components) - 1]] = cube_bg
+
+        canvas.draw_template((start_y, start_x), hex_template, labels)
+        canvas.draw_text(
+            (start_y + 5, start_x + 6), str(i).rjust(2, "0"), board_empty, board_bg
+        )
+
+    return canvas
@@ -1,70 +1,107 @@
+from functools import lru_cache
+from rich.console import Console, ConsoleOptions
+from rich.segment import Segment
+from rich.style import Style
 from rich.text import Text
 from harmonies_ai.tokens import Token
 
 
 Pixel = str | Token | Text
 
+# Character and style of one cell of the canvas
+Cell = tuple[str, str]
 
-def format_pixel(pixel: Pixel):
+_blank: Cell = (" ", "")
+
+
+def to_cell(pixel: Pixel) -> Cell:
     if isinstance(pixel, Text):
-        return pixel
+        return pixel.plain, str(pixel.style)
     if isinstance(pixel, Token):
         pixel = pixel.bg
-    return Text(" ", style=f"on {pixel}")
+    return " ", f"on {pixel}"
+
+
+@lru_cache(maxsize=1024)
+def _row_segments(row: tuple[Cell, ...]) -> tuple[Segment, ...]:
+    # Rows that haven't changed since the last frame come straight from the cache,
+    # and the rest are merged into one segment per run of the same style
+    segments = []
+    start = 0
+    for x in range(1, len(row) + 1):
+        if x == len(row) or row[x][1] != row[start][1]:
+            text = "".join(char for char, _ in row[start:x])
+            style = row[start][1]
+            segments.append(Segment(text, Style.parse(style)))
+            start = x
+    return tuple(segments)
+
+
+@lru_cache(maxsize=64)
+def _compile_template(template: tuple[str, ...]):
+    # Every character of the template with its offset and lowercase label
+    return tuple(
+        (y, x, char, char.lower())
+        for y, line in enumerate(template)
+        for x, char in enumerate(line)
+    )
 
 
 class RichCanvas:
+    """Grid of coloured cells, kept as one list of cells per row."""
+
     origin: int
-    pixels: dict[tuple[int, int], Pixel]
+    rows: list[list[Cell]]
 
     def __init__(self):
         self.origin = 0
-        self.pixels = {}
+        self.rows = []
+
+    def _row(self, y: int, width: int):
+        while len(self.rows) <= y:
+            self.rows.append([])
+        row = self.rows[y]
+        if len(row) < width:
+            row.extend([_blank] * (width - len(row)))
+        return row
 
     def advance_origin(self, extra_space: int):
-        y_max = max((y for y, _ in self.pixels), default=0)
+        y_max = max(len(self.rows) - 1, 0)
         self.origin = y_max + 1 + extra_space
 
-    def draw_pixel(self, pos: tuple[int, int], pixel: Pixel):
+    def _draw_cell(self, pos: tuple[int, int], cell: Cell):
         y, x = pos[0] + self.origin, pos[1]
-        self.pixels[(y, x)] = pixel
+        self._row(y, x + 1)[x] = cell
+
+    def draw_pixel(self, pos: tuple[int, int], pixel: Pixel):
+        self._draw_cell(pos, to_cell(pixel))
 
     def draw_rect(self, pos: tuple[int, int], size: tuple[int, int], pixel: Pixel):
-        y_start, x_start = pos[0], pos[1]
+        y_start, x_start = pos[0] + self.origin, pos[1]
         height, width = size[0], size[1]
 
+        cell = to_cell(pixel)
         for y in range(y_start, y_start + height):
-            for x in range(x_start, x_start + width):
-                self.draw_pixel((y, x), pixel)
+            self._row(y, x_start + width)[x_start : x_start + width] = [cell] * width
 
     def draw_template(
         self, pos: tuple[int, int], template: list[str], labels: dict[str, Pixel]
     ):
-        for y, line in enumerate(template):
-            for x, char in enumerate(line):
-                if char in labels:
-                    self.draw_pixel((pos[0] + y, pos[1] + x), labels[char])
-                elif char.lower() in labels:
-                    self.draw_pixel((pos[0] + y, pos[1] + x), labels[char.lower()])
+        cells = {char: to_cell(pixel) for char, pixel in labels.items()}
+        for y, x, char, lower in _compile_template(tuple(template)):
+            if char in cells:
+                self._draw_cell((pos[0] + y, pos[1] + x), cells[char])
+            elif lower in cells:
+                self._draw_cell((pos[0] + y, pos[1] + x), cells[lower])
 
     def draw_text(self, pos: tuple[int, int], text: str, bg: str, fg: str):
+        style = f"{fg} on {bg}"
         for x, char in enumerate(text):
-            self.draw_pixel((pos[0], pos[1] + x), Text(char, style=f"{fg} on {bg}"))
-
-    def __rich__(self):
-        y_range = range(0, max(y for y, _ in self.pixels) + 1)
-        x_range = range(0, max(x for _, x in self.pixels) + 1)
-
-        return Text("\n").join(
-            Text.assemble(
-                *(
-                    (
-                        format_pixel(self.pixels[(y, x)])
-                        if (y, x) in self.pixels
-                        else " "
-                    )
-                    for x in x_range
-                )
-            )
-            for y in y_range
-        )
+            self._draw_cell((pos[0], pos[1] + x), (char, style))
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions):
+        width = max((len(row) for row in self.rows), default=0)
+        for y, row in enumerate(self.rows):
+            if y:
+                yield Segment.line()
+            yield from _row_segments(tuple(row) + (_blank,) * (width - len(row)))
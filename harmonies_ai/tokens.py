@@ -1,8 +1,8 @@
-from rich.text import Text
 from enum import Enum
 
 
 class Token(Enum):
+    index: int
     bg: str
     fg: str
 
@@ -26,10 +26,13 @@ class Token(Enum):
         return self.name
 
     def __rich__(self):
+        from rich.text import Text
+
         return Text(f" {self.name} ", style=f"{self.fg} on {self.bg}")
 
 
 class Stack(Enum):
+    index: int
     components: tuple[Token, ...]
     alt_components: tuple[tuple[Token, ...], ...]
 
@@ -65,6 +68,8 @@ class Stack(Enum):
         return self.name
 
     def __rich__(self):
+        from rich.text import Text
+
         if len(self.components) == 0:
             return self.name
         return Text(
@@ -76,18 +81,22 @@ class Stack(Enum):
         return _placements[self]
 
 
-_placements: dict[Stack, dict[Token, Stack]] = {
-    stack: {
-        next_stack.components[-1]: next_stack
-        for next_stack in Stack
-        if any(
-            stack.components == next_components[:-1]
-            for next_components in (next_stack.components, *next_stack.alt_components)
-        )
-        and len(stack.components) == len(next_stack.components) - 1
-    }
-    for stack in Stack
-}
+# Stable integer index for each token and stack, used by array and bitmask
+# representations
+for _index, _token in enumerate(Token):
+    _token.index = _index
+for _index, _stack in enumerate(Stack):
+    _stack.index = _index
+
+
+# Maps each stack to the stacks made by placing each token on top of it
+_placements: dict[Stack, dict[Token, Stack]] = {stack: {} for stack in Stack}
+_stacks_by_components = {stack.components: stack for stack in Stack}
+for _stack in Stack:
+    for _components in (_stack.components, *_stack.alt_components):
+        if _components and _components[:-1] in _stacks_by_components:
+            _below = _stacks_by_components[_components[:-1]]
+            _placements[_below][_stack.components[-1]] = _stack
 
 
 # def _find_compatible(stack: Stack):
@@ -0,0 +1,84 @@
+import statistics
+import numpy as np
+import pytest
+from harmonies_ai import aggregate
+from harmonies_ai.aggregate import RunningStats, ShardedResults
+from harmonies_ai.ai import runner
+
+
+def test_running_stats():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    assert stats.mean == statistics.mean(values)
+    assert abs(stats.variance - statistics.variance(values)) < 1e-9
+    assert (stats.min, stats.max) == (1, 9)
+    assert stats.histogram[1] == 2
+
+    restored = RunningStats.from_dict(stats.to_dict())
+    assert restored.to_dict() == stats.to_dict()
+
+
+def test_running_stats_add_array():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    added = RunningStats()
+    for value in values:
+        added.add(value)
+    merged = RunningStats()
+    merged.add(3)
+    merged.add_array(np.array(values[1:5]))
+    merged.add_array(np.array(values[5:]))
+
+    assert merged.count == added.count
+    assert abs(merged.mean - added.mean) < 1e-9
+    assert abs(merged.variance - added.variance) < 1e-9
+    assert (merged.min, merged.max) == (added.min, added.max)
+    assert merged.histogram == added.histogram
+
+
+def test_sharded_results_resume(tmp_path):
+    results = ShardedResults(tmp_path, ["total"], shard_size=10)
+    for game in range(25):
+        results.add({"game": game, "total": game * 2})
+    assert results.shards == 2
+
+    # Reopening without a flush loses only the games since the last shard
+    resumed = ShardedResults(tmp_path, ["total"], shard_size=10)
+    assert resumed.shards == 2
+    assert resumed.games == 20
+    assert resumed.stats["total"].mean == 19
+    remaining = [game for game in range(25) if not resumed.is_completed(game)]
+    assert remaining == list(range(20, 25))
+
+    for game in range(20, 25):
+        resumed.add({"game": game, "total": game * 2})
+    resumed.flush()
+    df = resumed.read()
+    assert sorted(df["game"]) == list(range(25))
+    assert resumed.stats["total"].mean == df["total"].mean()
+
+
+def test_parquet_without_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(aggregate, "parquet_available", lambda: False)
+    monkeypatch.setattr(runner, "parquet_available", lambda: False)
+    # Fails before any game is played rather than at the first shard
+    with pytest.raises(Exception, match="pyarrow"):
+        ShardedResults(tmp_path, ["total"], shard_format="parquet")
+    argv = ["--ai", "random", "--output", str(tmp_path), "--shard-format", "parquet"]
+    with pytest.raises(SystemExit):
+        runner.main(argv)
+    assert not list(tmp_path.iterdir())
+
+
+def test_sharded_results_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    results = ShardedResults(tmp_path, ["total"], shard_size=2, shard_format="parquet")
+    for game in range(3):
+        results.add({"game": game, "total": game})
+    results.flush()
+    assert len(list(tmp_path.glob("shard-*.parquet"))) == 2
+    assert sorted(results.read()["game"]) == [0, 1, 2]
+
+    resumed = ShardedResults(tmp_path, ["total"], shard_format="parquet")
+    assert resumed.games == 3
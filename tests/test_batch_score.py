@@ -0,0 +1,40 @@
+import numpy as np
+import random
+from harmonies_ai.ai.greedy import score_next_turns, score_turn
+from harmonies_ai.batch_score import score_batch
+from harmonies_ai.game_state import GameState
+from test_score import test_cases
+
+
+def to_array(states: list[GameState]):
+    return np.array([[stack.index for stack in gs.board] for gs in states])
+
+
+def test_score_cases():
+    states = []
+    for stacks, _ in test_cases:
+        gs = GameState()
+        for stack, pos in stacks:
+            gs.board[pos] = stack
+        states.append(gs)
+
+    totals = score_batch(to_array(states)).sum(axis=1)
+    assert totals.tolist() == [score for _, score in test_cases]
+
+
+def test_random_boards():
+    random.seed(0)
+    states = [
+        GameState.random(num_stacks=random.randint(0, 23), num_cubes=0)
+        for _ in range(500)
+    ]
+    assert score_batch(to_array(states)).tolist() == [
+        [*gs.score[:5], 0] for gs in states
+    ]
+
+
+def test_next_turns():
+    random.seed(0)
+    gs = GameState.random(num_stacks=12, num_cubes=2)
+    turns, totals = score_next_turns(gs)
+    assert totals.tolist() == [score_turn(gs, turn) for turn in turns]
@@ -0,0 +1,38 @@
+from random import Random
+from harmonies_ai.ai.beam import BeamSearch, score_upper_bound
+from harmonies_ai.ai.greedy import apply_turn
+from harmonies_ai.ai.mcts import sample_turns
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Stack
+
+
+def test_score_upper_bound():
+    rng = Random(0)
+    for seed in range(5):
+        gs = GameState(seed=seed)
+        states = []
+        while not gs.game_ended:
+            states.append(gs.copy())
+            apply_turn(gs, sample_turns(gs, rng, 1)[0]).end_turn()
+        total = gs.running_score.total
+        for turn, state in enumerate(states):
+            assert score_upper_bound(state, gs.turn - turn) >= total
+
+
+def test_beam_search():
+    gs = GameState(seed=0)
+    beam = BeamSearch(width=2, depth=2, samples=1)
+    turn = beam.search(gs)
+    assert beam.stats.depth == 2
+    assert beam.stats.nodes > 0
+    apply_turn(gs, turn)
+    assert gs.board.mask(Stack.EMPTY0).bit_count() == grid_size - 3
+
+
+def test_beam_time_limit():
+    gs = GameState(seed=0)
+    beam = BeamSearch(width=8, depth=6, samples=8, seconds=0.2)
+    beam.search(gs)
+    assert beam.stats.depth < 6
+    assert beam.stats.seconds < 1.0
@@ -0,0 +1,25 @@
+from harmonies_ai import bitboard
+from harmonies_ai.benchmark import benchmarks, compare, seeded_position
+
+
+def test_seeded_position():
+    assert seeded_position(3, 4).board == seeded_position(3, 4).board
+    assert seeded_position(3, 4).turn == 4
+    assert seeded_position(3, None).game_ended
+
+
+def test_compare():
+    baseline = {"fast": 1.0, "slow": 1.0}
+    results = {"fast": 1.1, "slow": 1.5, "new": 9.0}
+    assert compare(results, baseline, 0.2) == ["slow"]
+
+
+def test_group_benchmarks_miss_the_caches():
+    for name in ("score_full", "find_groups", "find_longest_river"):
+        timed = benchmarks[name]()
+        timed()
+        first = bitboard.cache_info()
+        timed()
+        # Each call starts from cleared caches, so repeats do the same work
+        assert bitboard.cache_info() == first
+        assert any(info.misses for info in first.values())
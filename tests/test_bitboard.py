@@ -0,0 +1,105 @@
+import random
+from harmonies_ai.bitboard import BitBoard, find_group_masks, grouped_stacks
+from harmonies_ai.bitboard import iter_bits
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import grid_mask, grid_size
+from harmonies_ai.tokens import Stack, Token
+
+
+def test_list_view():
+    board = BitBoard()
+    board[3] = Stack.WATER1
+    board[7] = Stack.MOUNT2
+    board[3] = Stack.FIELD1
+
+    assert len(board) == grid_size
+    assert board[3] == Stack.FIELD1
+    assert list(board).count(Stack.EMPTY0) == grid_size - 2
+    assert board.mask(Stack.FIELD1) == 1 << 3
+    assert board.mask(Stack.WATER1) == 0
+    assert board.mask(Stack.EMPTY0) == grid_mask & ~(1 << 3 | 1 << 7)
+
+
+def test_cube_view():
+    board = BitBoard()
+    board.cubes[5] = True
+    assert board.cube_mask == 1 << 5
+    assert [pos for pos, cube in enumerate(board.cubes) if cube] == [5]
+    board.cubes[5] = False
+    assert board.cube_mask == 0
+
+
+def test_masks_match_cells():
+    for seed in range(50):
+        random.seed(seed)
+        board = GameState.random().board
+        for stack in Stack:
+            assert set(iter_bits(board.mask(stack))) == {
+                pos for pos, s in enumerate(board) if s == stack
+            }
+
+
+def test_placement_masks_follow_changes():
+    rng = random.Random(0)
+    board = BitBoard()
+    for _ in range(2000):
+        pos = rng.randrange(grid_size)
+        if rng.random() < 0.2:
+            board.cubes[pos] = not board.cubes[pos]
+        else:
+            board[pos] = rng.choice(list(Stack))
+        for token in Token:
+            assert board.placement_mask(token) == sum(
+                1 << pos
+                for pos, stack in enumerate(board)
+                if token in stack.placements and not board.cubes[pos]
+            )
+
+
+def test_stack_groups_follow_changes():
+    rng = random.Random(0)
+    board = BitBoard()
+    # Mostly grouped stacks, so groups keep joining up and splitting apart
+    stacks = [*grouped_stacks, *grouped_stacks, Stack.EMPTY0, Stack.MOUNT1]
+    for _ in range(3000):
+        board[rng.randrange(grid_size)] = rng.choice(stacks)
+        for stack in grouped_stacks:
+            groups = board.groups(stack)
+            expected = find_group_masks(board.mask(stack))
+            assert sorted(groups.masks.values()) == sorted(expected)
+            assert groups.large_groups == sum(g.bit_count() >= 2 for g in expected)
+            for group in expected:
+                for pos in iter_bits(group):
+                    assert groups.group(pos) == group
+        assert board.fields == board.score_fields()
+        assert board.water == board.score_water()
+
+
+def test_find_groups_from_kept_groups():
+    for seed in range(50):
+        random.seed(seed)
+        gs = GameState.random(stack_options=list(grouped_stacks), num_stacks=15)
+        for stack in grouped_stacks:
+            groups = find_group_masks(gs.board.mask(stack))
+            assert gs.find_groups(stack) == [set(iter_bits(g)) for g in groups]
+            for group in groups:
+                assert all(gs.group_of(stack, pos) == group for pos in iter_bits(group))
+
+
+def test_find_group_masks():
+    groups = find_group_masks(sum(1 << pos for pos in [0, 1, 5, 3, 4, 22]))
+    assert sorted(set(iter_bits(group)) for group in groups) == [
+        {0, 1, 5},
+        {3, 4},
+        {22},
+    ]
+
+
+def test_running_score_after_reassignment(monkeypatch):
+    monkeypatch.setattr(GameState, "debug_scoring", True)
+    rng = random.Random(0)
+    for _ in range(200):
+        gs = GameState()
+        for _ in range(30):
+            gs.board[rng.randrange(grid_size)] = rng.choice(list(Stack))
+            gs.running_score
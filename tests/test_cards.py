@@ -0,0 +1,37 @@
+import pytest
+import random
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import grid_size, shape_rotations
+from harmonies_ai.tokens import Stack
+
+
+def could_place_cube(gs: GameState, card: AnimalCard, pos: int):
+    return gs.board[pos] == card.base and any(
+        all(gs.board[p] == card.reqs[v] for p, v in rotation.items())
+        for rotation in shape_rotations[card.shape][pos]
+    )
+
+
+@pytest.mark.parametrize("card", list(AnimalCard))
+def test_could_place_cube(card: AnimalCard):
+    random.seed(0)
+    stack_options = [card.base, *card.reqs, Stack.EMPTY0]
+    for _ in range(50):
+        gs = GameState.random(stack_options, num_stacks=grid_size, num_cubes=0)
+        for pos in range(grid_size):
+            assert gs.could_place_cube(card, pos) == could_place_cube(gs, card, pos)
+
+
+def test_legal_cube_placements():
+    random.seed(0)
+    for _ in range(200):
+        gs = GameState.random(num_stacks=grid_size, num_cubes=5)
+        for card in random.sample(list(AnimalCard), 4):
+            gs.cards[card] = card.num_cubes
+        assert gs.legal_cube_placements() == [
+            (card, pos)
+            for card in gs.cards
+            for pos in range(grid_size)
+            if not gs.cubes[pos] and could_place_cube(gs, card, pos)
+        ]
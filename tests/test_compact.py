@@ -0,0 +1,57 @@
+import pickle
+import pytest
+from harmonies_ai.ai import greedy
+from harmonies_ai.compact import CompactState
+from harmonies_ai.game_state import GameState
+
+
+def played_states():
+    gs = GameState(0)
+    states = [gs.copy()]
+    while not gs.game_ended:
+        turn, _ = greedy.best_legal_turn(gs, width=16)
+        # Mid-turn states too, with tokens placed and a card taken
+        for action in turn:
+            gs.apply(action)
+            states.append(gs.copy())
+        gs.end_turn()
+        states.append(gs.copy())
+    return states
+
+
+def test_round_trip():
+    states = played_states()
+    assert any(gs.cards for gs in states) and any(gs.completed_cards for gs in states)
+    for gs in states:
+        compact = CompactState.from_state(gs)
+        restored = compact.to_state(seed=0)
+        assert restored.board == gs.board
+        assert restored.cubes == gs.cubes
+        assert restored.supply_tokens == gs.supply_tokens
+        assert restored._supply_cumulative == gs._supply_cumulative
+        assert restored.supply_cards == gs.supply_cards
+        assert restored.display_tokens == gs.display_tokens
+        assert restored.display_cards == gs.display_cards
+        assert restored.cards == gs.cards
+        assert sorted(restored.completed_cards) == sorted(gs.completed_cards)
+        assert restored._placed_tokens == gs._placed_tokens
+        assert restored._taken_card == gs._taken_card
+        assert restored.turn == gs.turn
+        assert restored.running_score.total == gs.score.total
+        assert CompactState.from_state(restored) == compact
+
+
+def test_dict_key():
+    states = played_states()
+    index = {CompactState.from_state(gs): i for i, gs in enumerate(states)}
+    assert len(index) == len(states)
+    for i, gs in enumerate(states):
+        assert index[CompactState.from_state(gs)] == i
+
+
+def test_immutable_and_picklable():
+    compact = CompactState.from_state(GameState(0))
+    with pytest.raises(Exception):
+        compact.turn = 3
+    assert len(compact.board) == 23
+    assert pickle.loads(pickle.dumps(compact)) == compact
@@ -0,0 +1,41 @@
+import io
+import time
+from rich.console import Console
+from harmonies_ai.aggregate import RunningStats
+from harmonies_ai.ai.dashboard import Dashboard, sparkline
+from harmonies_ai.ai.runner import RunOptions, play_game
+
+
+def test_sparkline():
+    stats = RunningStats()
+    for value in (0, 0, 1, 3):
+        stats.add(value)
+    assert sparkline(stats, bins=4) == "█▅ ▅"
+
+
+def test_dashboard():
+    output = io.StringIO()
+    summary = {"total": RunningStats()}
+    options = RunOptions(turn_times=True, record=True)
+    with Dashboard(summary, 2, Console(file=output, width=120)) as dashboard:
+        for game in range(2):
+            result = play_game("random", 0, game, options)
+            summary["total"].add(result.total)
+            dashboard.update(result)
+
+    assert dashboard.played == 2
+    assert len(dashboard.slowest_turns) == 5
+    assert dashboard.sample.score.total == dashboard.sample.running_score.total
+    assert "Slowest turns" in output.getvalue()
+
+
+def test_dashboard_refreshes_between_results():
+    output = io.StringIO()
+    console = Console(file=output, width=120, force_terminal=True)
+    with Dashboard({}, 1, console, refresh_rate=20) as dashboard:
+        dashboard.update(play_game("random", 0, 0))
+        before = output.getvalue()
+        time.sleep(1.2)
+        # The elapsed time moves on without any new results
+        assert output.getvalue() != before
+        assert "1/1 games in 1s" in output.getvalue()
@@ -0,0 +1,37 @@
+import numpy as np
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.ai.greedy import apply_turn, next_turn_boards
+from harmonies_ai.encode import _offsets, encode_next_turns, encode_state, feature_size
+from harmonies_ai.game_state import GameState
+from harmonies_ai.grid import grid_size
+from harmonies_ai.tokens import Stack
+
+
+def test_encodes_one_stack_per_position():
+    gs = random_ai.simulate_game(GameState(0))
+    features = encode_state(gs)
+    assert features.shape == (feature_size,)
+    assert features.dtype == np.float32
+
+    stacks = features[: _offsets["cubes"]].reshape(grid_size, len(Stack))
+    assert (stacks.sum(axis=1) == 1).all()
+    assert stacks.argmax(axis=1).tolist() == [stack.index for stack in gs.board]
+
+
+def test_next_turns_match_the_states_they_lead_to():
+    gs = GameState(1)
+    for _ in range(3):
+        turns, _ = next_turn_boards(gs)
+        apply_turn(gs, turns[0]).end_turn()
+
+    turns, boards = next_turn_boards(gs)
+    features = encode_next_turns(gs, boards)
+    assert features.shape == (len(turns), feature_size)
+
+    for turn, row in zip(turns[:10], features):
+        child = apply_turn(gs.copy(), turn)
+        expected = encode_state(child)
+        # Only the board is known before the next display is drawn
+        cubes = _offsets["cubes"]
+        assert (row[:cubes] == expected[:cubes]).all()
+        assert row[_offsets["turn"]] == (gs.turn + 1) / 20
@@ -0,0 +1,83 @@
+import random
+from harmonies_ai.ai.greedy import apply_actions, best_legal_turn, get_legal_turns
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import DiscardCardAction, GameState, TakeCardAction
+from harmonies_ai.grid import grid_size
+
+
+def test_card_points():
+    card = AnimalCard.BUTTERFLY
+    assert [card.points(n) for n in range(card.num_cubes, -1, -1)] == [
+        0,
+        2,
+        5,
+        8,
+        12,
+        17,
+    ]
+
+
+def test_completed_cards_undo():
+    random.seed(0)
+    placements = []
+    while not placements:
+        gs = GameState.random(num_stacks=grid_size, num_cubes=0)
+        gs.cards = {card: 1 for card in random.sample(list(AnimalCard), 4)}
+        placements = gs.legal_cube_placements()
+
+    card, pos = placements[0]
+    with gs.explore():
+        gs.place_cube(card, pos)
+        assert gs.completed_cards == [card]
+        assert sum(gs.card_points()) == sum(
+            c.points(n) for c, n in gs.cards.items()
+        ) + card.points(0)
+        assert gs.running_score == gs.score
+    assert gs.completed_cards == []
+    assert gs.cards[card] == 1
+
+
+def test_best_legal_turn_is_best_of_legal_turns():
+    random.seed(1)
+    for _ in range(5):
+        gs = GameState.random(num_stacks=12, num_cubes=2)
+        gs.display_tokens = gs.display_tokens[:1]
+        gs.cards = {card: card.num_cubes - 1 for card in gs.display_cards[:2]}
+        gs.display_cards = gs.display_cards[2:]
+
+        totals = []
+        for turn in get_legal_turns(gs):
+            with gs.explore():
+                apply_actions(gs, turn)
+                assert gs.running_score == gs.score
+                totals.append(gs.running_score.total)
+
+        turn, total = best_legal_turn(gs)
+        assert total == max(totals)
+        with gs.explore():
+            assert apply_actions(gs, turn).running_score.total == total
+
+
+def test_legal_turns_include_every_card_action():
+    gs = GameState(0)
+    gs.display_tokens = gs.display_tokens[:1]
+    # With no cards held, no cubes can be placed after the three tokens
+    first = next(get_legal_turns(gs))
+    card_actions = [turn[3:] for turn in get_legal_turns(gs) if turn[:3] == first]
+    assert card_actions.count(()) == 1
+    display = gs.display_cards
+    assert set(card_actions) - {()} == {
+        *((TakeCardAction(card),) for card in display),
+        *((DiscardCardAction(card),) for card in display),
+    }
+
+
+def test_best_legal_turn_places_every_cube_it_can():
+    random.seed(2)
+    for _ in range(20):
+        gs = GameState.random(num_stacks=18, num_cubes=0)
+        gs.cards = {card: card.num_cubes for card in gs.display_cards[:3]}
+        turn, _ = best_legal_turn(gs, width=16)
+        with gs.explore():
+            # Every cube placed gains points, so none should be left to place
+            assert apply_actions(gs, turn).legal_cube_placements() == []
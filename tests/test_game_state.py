@@ -0,0 +1,58 @@
+import subprocess
+import sys
+from itertools import accumulate
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.game_state import GameState
+from harmonies_ai.tokens import Token
+
+
+def draws(gs: GameState, turns: int):
+    result = []
+    for _ in range(turns):
+        tokens = gs.display_tokens[0]
+        for token in tokens:
+            pos = next(
+                pos for pos, stack in enumerate(gs.board) if token in stack.placements
+            )
+            gs.place_token(token, pos)
+        gs.end_turn()
+        result.append((gs.display_tokens, tuple(gs.display_cards)))
+    return result
+
+
+def test_seeded_games_match():
+    first = random_ai.simulate_game(GameState(seed=7))
+    second = random_ai.simulate_game(GameState(seed=7))
+    assert list(first.board) == list(second.board)
+    assert first.turn == second.turn
+
+
+def test_search_does_not_disturb_draws():
+    expected = draws(GameState(seed=3), 4)
+
+    gs = GameState(seed=3)
+    random_ai.simulate_game(gs.copy())
+    with gs.explore():
+        random_ai.simulate_game(gs)
+    assert draws(gs, 4) == expected
+
+
+def test_copies_draw_independently():
+    gs = GameState(seed=3)
+    assert draws(gs.copy(), 4) != draws(gs.copy(), 4)
+
+
+def test_supply_table():
+    gs = random_ai.simulate_game(GameState(seed=1))
+    assert gs._supply_cumulative == list(
+        accumulate(gs.supply_tokens[token] for token in Token)
+    )
+
+
+def test_headless_import():
+    code = "import sys, harmonies_ai.ai.runner; print(sorted(sys.modules))"
+    modules = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert "'rich'" not in modules
+    assert "'pandas'" not in modules
@@ -0,0 +1,28 @@
+import random
+from itertools import product
+from harmonies_ai.ai.greedy import apply_turn, get_next_turns
+from harmonies_ai.game_state import GameState
+
+
+def board_after(gs: GameState, turn):
+    with gs.explore():
+        return tuple(apply_turn(gs, turn).board)
+
+
+def test_next_turns_cover_distinct_boards():
+    random.seed(0)
+    gs = GameState.random(num_stacks=15, num_cubes=3)
+    gs.display_tokens = tuple(random.sample(gs.display_tokens, 2))
+
+    boards = [board_after(gs, turn) for turn in get_next_turns(gs)]
+    assert len(boards) == len(set(boards))
+
+    expected = set()
+    for tokens in gs.display_tokens:
+        spots = [pos for pos, cube in enumerate(gs.cubes) if not cube]
+        for turn in product(*[[(t, pos) for pos in spots] for t in tokens]):
+            try:
+                expected.add(board_after(gs, turn))
+            except Exception:
+                pass
+    assert set(boards) == expected
@@ -0,0 +1,62 @@
+from harmonies_ai import instrument
+from harmonies_ai.ai import greedy
+from harmonies_ai.ai.runner import RunOptions, play_game
+from harmonies_ai.game_state import GameState
+
+
+def test_disabled_by_default():
+    instrument.reset()
+    greedy.simulate_game(GameState(seed=0))
+    assert not instrument.counters
+    assert not instrument.turn_log
+
+
+def test_play_game_stats():
+    result = play_game("greedy", 0, 0, RunOptions(stats=True, turn_log=True))
+    counters = result.stats["counters"]
+    assert counters["states_generated"] == counters["batch_scores"] > 0
+    components = ("trees", "mountains", "fields", "buildings", "water")
+    assert set(result.stats["timers"]) >= {f"score_{name}" for name in components}
+    assert [record["turn"] for record in result.turn_log] == list(
+        range(1, result.turns + 1)
+    )
+    assert sum(r["states_generated"] for r in result.turn_log) == (
+        counters["states_generated"]
+    )
+    assert not instrument.enabled
+
+
+def test_explored_turns_not_logged():
+    instrument.enabled = instrument.log_turns = True
+    try:
+        instrument.reset()
+        gs = GameState(seed=0)
+        with gs.explore():
+            greedy.apply_turn(gs, next(greedy.get_next_turns(gs))).end_turn()
+        assert not instrument.turn_log
+        gs.copy()
+        gs.score
+        assert instrument.counters["copies"] == 1
+        assert instrument.counters["scores"] == 1
+        assert set(instrument.timers) >= {"score_trees", "score_water"}
+    finally:
+        instrument.enabled = instrument.log_turns = False
+
+
+def test_random_and_search_stats():
+    random = play_game("random", 0, 0, RunOptions(stats=True)).stats["counters"]
+    assert random["tokens_placed"] > 0
+
+    beam = play_game("beam", 0, 0, RunOptions(stats=True)).stats["counters"]
+    assert beam["running_scores"] > 0
+
+
+def test_turn_times_leave_counters_off():
+    result = play_game("greedy", 0, 0, RunOptions(turn_times=True))
+    assert [record["turn"] for record in result.turn_log] == list(
+        range(1, result.turns + 1)
+    )
+    # Only the time is logged, as nothing else was counted
+    assert all(record.keys() == {"turn", "seconds"} for record in result.turn_log)
+    assert not instrument.counters and not instrument.timers
+    assert not instrument.log_turns
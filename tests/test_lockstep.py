@@ -0,0 +1,34 @@
+import numpy as np
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.ai.lockstep import LockstepGames, simulate_games
+from harmonies_ai.game_state import GameState, initial_supply
+from harmonies_ai.tokens import Stack
+
+
+def test_games_follow_the_rules():
+    games = LockstepGames(500, seed=0).run()
+    heights = np.array([len(stack.components) for stack in Stack])
+
+    # Every turn places three tokens, drawn along with the display before it
+    assert (heights[games.boards].sum(axis=1) == 3 * games.turns).all()
+    drawn = sum(initial_supply.values()) - games.supply.sum(axis=1)
+    assert np.isin(drawn - 9 * games.turns, (0, 9)).all()
+    assert (games.supply >= 0).all()
+
+    empty = (games.boards == Stack.EMPTY0.index).sum(axis=1)
+    assert ((empty <= 2) | (games.supply.sum(axis=1) < 9)).all()
+
+
+def test_matches_scalar_statistics():
+    scalar = [random_ai.simulate_game(GameState(seed)) for seed in range(300)]
+    scalar_totals = np.array([gs.score.total for gs in scalar])
+    scalar_turns = np.array([gs.turn for gs in scalar])
+
+    scores, turns = simulate_games(20000, seed=0)
+    for expected, actual in (
+        (scalar_totals, scores.sum(axis=1)),
+        (scalar_turns, turns),
+    ):
+        # Means agree to within four standard errors of their difference
+        error = np.sqrt(expected.var() / len(expected) + actual.var() / len(actual))
+        assert abs(expected.mean() - actual.mean()) < 4 * error
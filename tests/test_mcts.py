@@ -0,0 +1,17 @@
+from harmonies_ai.ai.greedy import apply_turn
+from harmonies_ai.ai.mcts import Mcts
+from harmonies_ai.game_state import GameState
+
+
+def test_mcts_game():
+    gs = GameState(seed=0)
+    mcts = Mcts(seconds=None, iterations=25)
+    reused = []
+    while not gs.game_ended:
+        turn = mcts.search(gs)
+        assert mcts.stats.iterations == 25
+        assert mcts.stats.tree_size > 25
+        reused.append(mcts.stats.reused_size)
+        apply_turn(gs, turn).end_turn()
+        mcts.advance(turn)
+    assert any(reused)
@@ -0,0 +1,92 @@
+import pytest
+from harmonies_ai.ai import greedy
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.ai.runner import game_seed, main
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.game_state import (
+    DiscardCardAction,
+    EndTurnAction,
+    GameState,
+    PlaceCubeAction,
+    PlaceTokenAction,
+    TakeCardAction,
+)
+from harmonies_ai.record import GameRecord, RecordReader, RecordWriter
+from harmonies_ai.record import decode_actions, encode_actions
+from harmonies_ai.tokens import Token
+
+
+def test_encode_actions():
+    actions = [
+        PlaceTokenAction(Token.GRY, 0),
+        PlaceTokenAction(Token.YLW, 22),
+        TakeCardAction(AnimalCard.MEERKAT),
+        DiscardCardAction(AnimalCard.CROW),
+        PlaceCubeAction(AnimalCard.BEAR, 17),
+        EndTurnAction(),
+    ]
+    data = encode_actions(actions)
+    assert len(data) == 7
+    assert list(decode_actions(data)) == actions
+
+
+def test_replay():
+    gs = GameState(seed=3)
+    gs.take_card(gs.display_cards[1])
+    greedy.simulate_game(gs)
+    record = GameRecord.from_state(3, gs)
+
+    replayed = record.replay()
+    assert replayed.history == gs.history
+    assert replayed.board == gs.board
+    assert replayed.cards == gs.cards
+    assert replayed.display_tokens == gs.display_tokens
+
+    partial = record.replay(turn=4)
+    assert partial.turn == 4
+    assert partial.history == gs.history[: len(partial.history)]
+
+
+def test_record_file(tmp_path):
+    path = tmp_path / "games.hgr"
+    games = {seed: random_ai.simulate_game(GameState(seed)) for seed in range(6)}
+
+    # Appending across writers keeps every earlier record
+    for seeds in (range(3), range(3, 6)):
+        with RecordWriter(path) as writer:
+            for seed in seeds:
+                writer.append(GameRecord.from_state(seed, games[seed]))
+
+    with RecordReader(path) as reader:
+        assert len(reader) == 6
+        assert [record.seed for record in reader] == list(range(6))
+        for seed in (5, 0, 3):
+            assert reader[seed].replay().board == games[seed].board
+
+
+def test_run_seed_fits_record(tmp_path):
+    path = tmp_path / "games.rec"
+    largest = str((1 << 32) - 1)
+    main(["--ai", "random", "--games", "2", "--seed", largest, "--record", str(path)])
+    with RecordReader(path) as reader:
+        assert [record.seed >> 32 for record in reader] == [(1 << 32) - 1] * 2
+
+    for seed in ("-1", str(1 << 32)):
+        with pytest.raises(SystemExit):
+            main(["--ai", "random", "--seed", seed, "--record", str(path)])
+
+
+def test_find_game_from_parallel_run(tmp_path):
+    path = tmp_path / "games.rec"
+    argv = ["--ai", "random", "--games", "12", "--workers", "3", "--chunk-size", "2"]
+    main([*argv, "--seed", "7", "--record", str(path)])
+
+    with RecordReader(path) as reader:
+        games = sorted(record.seed & 0xFFFFFFFF for record in reader)
+        assert games == list(range(12))
+        for game in (11, 0, 5):
+            record = reader.find(game_seed(7, game))
+            expected = random_ai.simulate_game(GameState(game_seed(7, game)))
+            assert record.replay().board == expected.board
+        with pytest.raises(KeyError):
+            reader.find(game_seed(7, 12))
@@ -0,0 +1,32 @@
+from rich.console import Console
+from harmonies_ai.rich_canvas import RichCanvas
+from harmonies_ai.tokens import Token
+
+
+def render(canvas: RichCanvas):
+    console = Console(width=40, color_system="truecolor")
+    return [
+        [(segment.text, str(segment.style)) for segment in line]
+        for line in console.render_lines(canvas, pad=False)
+    ]
+
+
+def test_runs_merged():
+    canvas = RichCanvas()
+    canvas.draw_rect((0, 1), (2, 3), Token.GRY)
+    canvas.draw_pixel((0, 2), Token.GRY)
+    canvas.draw_text((1, 4), "ab", bg="red", fg="white")
+    assert render(canvas) == [
+        [(" ", "none"), ("   ", f"on {Token.GRY.bg.lower()}"), ("  ", "none")],
+        [(" ", "none"), ("   ", f"on {Token.GRY.bg.lower()}"), ("ab", "white on red")],
+    ]
+
+
+def test_template():
+    canvas = RichCanvas()
+    canvas.advance_origin(1)
+    canvas.draw_template((0, 0), ["aA.", "b.a"], {"a": "red", ".": "blue"})
+    assert render(canvas)[2:] == [
+        [("  ", "on red"), (" ", "on blue")],
+        [(" ", "none"), (" ", "on blue"), (" ", "on red")],
+    ]
@@ -59,3 +59,12 @@ def test_score(stacks: list[tuple[Stack, int]], score: int):
         for token in stack.components:
             gs._place_token(token, pos)
     assert gs.score.total == score
+
+
+@pytest.mark.parametrize("stacks, score", test_cases)
+def test_running_score(stacks: list[tuple[Stack, int]], score: int):
+    gs = GameState()
+    for stack, pos in stacks:
+        for token in stack.components:
+            gs._place_token(token, pos)
+    assert gs.running_score == gs.score
@@ -0,0 +1,43 @@
+from harmonies_ai.ai import random as random_ai
+from harmonies_ai.ai.transposition import ReplacementPolicy, TranspositionTable
+from harmonies_ai.bitboard import BitBoard
+from harmonies_ai.game_state import GameState
+
+
+def fresh_key(gs: GameState):
+    board = BitBoard()
+    for pos, (stack, cube) in enumerate(zip(gs.board, gs.cubes)):
+        board[pos] = stack
+        board.cubes[pos] = cube
+    return board.key
+
+
+def test_zobrist_keys():
+    gs = GameState.random(seed=0)
+    assert gs.key == fresh_key(gs)
+
+    start_key = gs.key
+    with gs.explore():
+        random_ai.simulate_game(gs)
+        assert gs.key == fresh_key(gs) != start_key
+    assert gs.key == start_key
+
+
+def test_replacement_policies():
+    always = TranspositionTable(4, ReplacementPolicy.ALWAYS)
+    depth = TranspositionTable(4, ReplacementPolicy.DEPTH)
+    for table in (always, depth):
+        table.store(0x10, 2, 1.0)
+        table.store(0x20, 1, 2.0)
+        assert table.lookup(0x10, 3) is None
+
+    assert always.lookup(0x20) == 2.0 and always.lookup(0x10) is None
+    assert depth.lookup(0x10) == 1.0 and depth.lookup(0x20) is None
+    assert depth.hit_rate == 1 / 3
+
+    # A shallower result for the same key doesn't replace a deeper one either
+    depth.store(0x10, 1, 3.0)
+    assert depth.lookup(0x10, 2) == 1.0
+    always.store(0x20, 0, 3.0)
+    assert always.lookup(0x20) == 3.0
+    assert depth.replacements == 0 and always.replacements == 1
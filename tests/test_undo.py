@@ -0,0 +1,46 @@
+import random
+from harmonies_ai.cards import AnimalCard
+from harmonies_ai.ai.greedy import apply_turn, get_next_turns
+from harmonies_ai.game_state import GameState
+from harmonies_ai.tokens import Stack
+
+
+def snapshot(gs: GameState):
+    return (
+        list(gs.board),
+        list(gs.cubes),
+        dict(gs.supply_tokens),
+        set(gs.supply_cards),
+        gs.display_tokens,
+        list(gs.display_cards),
+        dict(gs.cards),
+        gs._placed_tokens,
+        gs._taken_card,
+        gs.running_score,
+    )
+
+
+def test_undo_turns():
+    random.seed(0)
+    gs = GameState()
+    for _ in range(5):
+        before = snapshot(gs)
+        with gs.explore():
+            gs.take_card(gs.display_cards[1])
+            apply_turn(gs, next(get_next_turns(gs))).end_turn()
+            assert snapshot(gs) != before
+        assert snapshot(gs) == before
+        apply_turn(gs, next(get_next_turns(gs))).end_turn()
+
+
+def test_undo_cube():
+    gs = GameState()
+    gs.board[0] = Stack.MOUNT1
+    gs.board[1] = Stack.FIELD1
+    for cubes_left in (1, 4):
+        gs.cards[AnimalCard.MEERKAT] = cubes_left
+        before = snapshot(gs)
+        gs.place_cube(AnimalCard.MEERKAT, 0)
+        assert snapshot(gs) != before
+        gs.undo()
+        assert snapshot(gs) == before
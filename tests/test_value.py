@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from harmonies_ai.ai.positions import PositionShards, generate, shard_paths
+from harmonies_ai.ai.value import (
+    PositionDataset,
+    ValueNet,
+    evaluate_next_turns,
+    load_model,
+    main,
+    simulate_game,
+    train,
+)
+from harmonies_ai.encode import feature_size
+from harmonies_ai.game_state import GameState
+
+
+def test_shards_split_positions(tmp_path):
+    with PositionShards(tmp_path, shard_size=4) as shards:
+        shards.add(np.ones((6, feature_size), np.float32), 50)
+        shards.add(np.zeros((3, feature_size), np.float32), 70)
+
+    paths = list(shard_paths(tmp_path))
+    labels = [np.load(path).tolist() for _, path in paths]
+    assert labels == [[50] * 4, [50, 50, 70, 70], [70]]
+    assert not list(tmp_path.glob("*.tmp"))
+
+    dataset = PositionDataset(tmp_path)
+    assert len(dataset) == 9
+    features, label = dataset[5]
+    assert features.shape == (feature_size,)
+    assert features.sum() == feature_size and label == 50
+    assert dataset[8][1] == 70
+
+
+def test_trains_on_generated_positions(tmp_path):
+    data = tmp_path / "positions"
+    generate(data, games=6, ai="random", shard_size=20)
+    dataset = PositionDataset(data)
+    assert len(dataset) > 20
+    assert len(dataset.shards) == -(-len(dataset) // 20)
+
+    model_path = tmp_path / "value.pt"
+    model, losses = train(data, model_path, epochs=2, batch_size=16, hidden=(32,))
+    assert len(losses) == 2
+
+    with pytest.raises(Exception, match="Unknown AI"):
+        generate(data, games=1, ai="gready")
+    with pytest.raises(SystemExit):
+        main(["generate", "--ai", "value"])
+
+    loaded = ValueNet.load(model_path)
+    gs = GameState(0)
+    turns, values = evaluate_next_turns(gs, loaded)
+    assert values.shape == (len(turns),)
+    assert np.allclose(values, evaluate_next_turns(gs, model.eval())[1])
+
+    gs = simulate_game(GameState(0), load_model(model_path))
+    assert gs.game_ended